@@ -0,0 +1,339 @@
+"""Times the parser, results table and source viewer on synthetic pages.
+
+Pages are generated locally so every run uses the same input. Qt runs
+offscreen unless QT_QPA_PLATFORM is already set. Results can be saved and
+later runs compared against them to catch regressions.
+
+    python benchmarks/hot_paths.py --save baseline
+    python benchmarks/hot_paths.py --compare baseline
+    python benchmarks/hot_paths.py --quick --filter parser
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+MB = 1024 * 1024
+
+sys.path.insert(0, ROOT)
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+WORDS = [
+    'alpha', 'bravo', 'charlie', 'delta', 'echo', 'foxtrot', 'golf', 'hotel',
+    'india', 'juliet', 'kilo', 'lima', 'mike', 'november', 'oscar', 'papa',
+]
+BENCHMARKS = []
+PAGES = {}
+APP = []
+
+
+def benchmark(name, slow=False, **params):
+    # stacked to register the same benchmark with different parameters
+    def register(setup):
+        BENCHMARKS.append({
+            'name': name.format(**params),
+            'setup': setup,
+            'params': params,
+            'slow': slow,
+        })
+        return setup
+    return register
+
+
+def make_page(size, seed=0):
+    # a product listing, the sort of page spiders are written for
+    rng = random.Random(seed)
+    parts = [
+        '<!DOCTYPE html>\n<html><head><title>Synthetic catalogue</title>',
+        '<style>.item { margin: 0 } .price { font-weight: bold }</style>',
+        '</head><body><div id="content"><ul class="products">\n',
+    ]
+    length = sum(len(part) for part in parts)
+    index = 0
+    while length < size:
+        words = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 30)))
+        part = (
+            f'<li class="item product-{index % 7}" data-id="{index}"><div class="card">'
+            f'<h2 class="name"><a href="/product/{index}">Product {index} {rng.choice(WORDS)}</a></h2>'
+            f'<span class="price">${rng.randint(100, 999999) / 100:.2f}</span>'
+            f'<p class="description">{words}</p></div></li>\n'
+        )
+        parts.append(part)
+        length += len(part)
+        index += 1
+    parts.append('</ul></div><script>var loaded = true;</script></body></html>\n')
+    return ''.join(parts)
+
+
+def get_page(megabytes):
+    if megabytes not in PAGES:
+        PAGES[megabytes] = make_page(int(megabytes * MB))
+    return PAGES[megabytes]
+
+
+def get_app():
+    from PyQt5.QtWidgets import QApplication
+
+    if not APP:
+        APP.append(QApplication.instance() or QApplication(sys.argv))
+    return APP[0]
+
+
+def get_parser(megabytes):
+    from parsel import Selector
+    from scrapy_gui.utils_ui.parser import Parser, fingerprint
+
+    text = get_page(megabytes)
+    return Parser(Selector(text=text), fingerprint(text))
+
+
+def parser_case(megabytes, query, query_type, regex=None, function=None, cached=False):
+    from scrapy_gui.utils_ui.parser import clear_caches
+
+    parser = get_parser(megabytes)
+
+    def run():
+        # cold runs clear the caches so every stage is measured
+        if not cached:
+            clear_caches()
+        parser.do_query(query, query_type, parser.selector, regex, function)
+
+    run()
+    return run
+
+
+USER_FUN = """
+def user_fun(results, selector):
+    return [result.rsplit('/', 1)[-1] for result in results]
+"""
+
+
+@benchmark('parser.css[{mb}MB]', mb=1)
+@benchmark('parser.css[{mb}MB]', slow=True, mb=20)
+def parser_css(mb):
+    return parser_case(mb, 'li.item h2.name a::text', 'css')
+
+
+@benchmark('parser.xpath[{mb}MB]', mb=1)
+@benchmark('parser.xpath[{mb}MB]', slow=True, mb=20)
+def parser_xpath(mb):
+    return parser_case(mb, '//li[contains(@class, "item")]//a/@href', 'xpath')
+
+
+@benchmark('parser.regex[{mb}MB]', mb=1)
+@benchmark('parser.regex[{mb}MB]', slow=True, mb=20)
+def parser_regex(mb):
+    return parser_case(mb, 'span.price::text', 'css', regex=r'\$(\d+)\.\d+')
+
+
+@benchmark('parser.function[{mb}MB]', mb=1)
+@benchmark('parser.function[{mb}MB]', slow=True, mb=20)
+def parser_function(mb):
+    return parser_case(mb, 'a::attr(href)', 'css', function=USER_FUN)
+
+
+@benchmark('parser.cached[{mb}MB]', mb=1)
+def parser_cached(mb):
+    return parser_case(mb, 'li.item h2.name a::text', 'css', cached=True)
+
+
+@benchmark('results.add_results[{rows}]', rows=1000)
+@benchmark('results.add_results[{rows}]', rows=100000)
+def results_add(rows):
+    from scrapy_gui.utils_ui.tools_tab_ui import ResultsWidget
+
+    app = get_app()
+    widget = ResultsWidget()
+    widget.resize(800, 600)
+    widget.show()
+    results = [f'<a href="/product/{index}">Product {index}</a>' for index in range(rows)]
+
+    def run():
+        widget.add_results(results)
+        app.processEvents()
+
+    return run
+
+
+def load_viewer(viewer, text):
+    viewer.setPlainText(text)
+    # the viewer adds chunks from a timer, here they are all added straight away
+    while viewer.chunks is not None:
+        viewer.load_chunk()
+
+
+def make_viewer(megabytes, search=None, regex=False):
+    from scrapy_gui.utils_ui.text_viewer import TextViewer
+
+    get_app()
+    viewer = TextViewer()
+    viewer.resize(1000, 800)
+    viewer.show()
+    load_viewer(viewer, get_page(megabytes))
+    if search is not None:
+        viewer.search_bar.blockSignals(True)
+        viewer.search_bar.setText(search)
+        viewer.search_bar.blockSignals(False)
+        viewer.regex_check.blockSignals(True)
+        viewer.regex_check.setChecked(regex)
+        viewer.regex_check.blockSignals(False)
+    return viewer
+
+
+def search_viewer(viewer):
+    viewer.find_indexes()
+    while viewer.matches is not None:
+        viewer.collect_matches()
+
+
+@benchmark('viewer.load[{mb}MB]', mb=1)
+@benchmark('viewer.load[{mb}MB]', slow=True, mb=20)
+def viewer_load(mb):
+    viewer = make_viewer(mb)
+    text = get_page(mb)
+    return lambda: load_viewer(viewer, text)
+
+
+@benchmark('viewer.find_indexes[{mb}MB]', mb=1)
+@benchmark('viewer.find_indexes[{mb}MB]', slow=True, mb=20)
+def viewer_find(mb):
+    viewer = make_viewer(mb, search='product')
+    return lambda: search_viewer(viewer)
+
+
+@benchmark('viewer.find_indexes_regex[{mb}MB]', mb=1)
+@benchmark('viewer.find_indexes_regex[{mb}MB]', slow=True, mb=20)
+def viewer_find_regex(mb):
+    viewer = make_viewer(mb, search=r'\$\d+\.\d\d', regex=True)
+    return lambda: search_viewer(viewer)
+
+
+@benchmark('viewer.set_format[{mb}MB]', mb=1)
+@benchmark('viewer.set_format[{mb}MB]', slow=True, mb=20)
+def viewer_set_format(mb):
+    viewer = make_viewer(mb, search='product')
+    search_viewer(viewer)
+    scroll_bar = viewer.source_text.verticalScrollBar()
+    scroll_bar.setValue(scroll_bar.maximum() // 2)
+    return viewer.set_format
+
+
+def bs4_prettify(mb):
+    # the formatter the source tab used before prettify_selector, kept for comparison
+    from bs4 import BeautifulSoup
+
+    text = get_page(mb)
+    return lambda: BeautifulSoup(text, 'html.parser').prettify()
+
+
+# bs4 isn't a dependency, so it's only compared against when installed
+if importlib.util.find_spec('bs4') is not None:
+    benchmark('bs4.prettify[{mb}MB]', mb=1)(bs4_prettify)
+
+
+@benchmark('prettify.prettify_selector[{mb}MB]', mb=1)
+@benchmark('prettify.prettify_selector[{mb}MB]', slow=True, mb=20)
+def prettify_selector(mb):
+    from scrapy_gui.utils_ui.prettify import prettify_selector
+
+    selector = get_parser(mb).selector
+    return lambda: prettify_selector(selector)
+
+
+def run_benchmark(case, repeat):
+    function = case['setup'](**case['params'])
+    timer = timeit.Timer(function)
+    # enough loops for each repeat to take 0.2s, slow cases run once per repeat
+    number, _ = timer.autorange()
+    times = [total / number for total in timer.repeat(repeat, number)]
+    return {
+        'name': case['name'],
+        'best_ms': round(min(times) * 1000, 4),
+        'median_ms': round(statistics.median(times) * 1000, 4),
+        'loops': number,
+        'repeat': repeat,
+    }
+
+
+def get_results_path(name):
+    if name.endswith('.json') or os.sep in name:
+        return name
+    return os.path.join(RESULTS_DIR, f'{name}.json')
+
+
+def get_environment():
+    from PyQt5.QtCore import QT_VERSION_STR
+    import lxml.etree
+    import parsel
+
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'qt': QT_VERSION_STR,
+        'lxml': lxml.etree.__version__,
+        'parsel': parsel.__version__,
+    }
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('-n', '--repeat', type=int, default=5)
+    arg_parser.add_argument('-k', '--filter', default='', help='only run benchmarks with this in their name')
+    arg_parser.add_argument('--quick', action='store_true', help='skip the 20MB pages')
+    arg_parser.add_argument('--save', help='save results under this name, or to this json file')
+    arg_parser.add_argument('--compare', help='compare with results saved under this name, or in this json file')
+    arg_parser.add_argument('--threshold', type=float, default=1.25, help='slowdown ratio reported as a regression')
+    arg_parser.add_argument('--list', action='store_true', help='list benchmarks without running them')
+    args = arg_parser.parse_args(argv)
+
+    cases = [
+        case for case in sorted(BENCHMARKS, key=lambda case: case['name'])
+        if args.filter in case['name'] and not (args.quick and case['slow'])
+    ]
+    if args.list:
+        for case in cases:
+            print(case['name'])
+        return 0
+
+    baseline = {}
+    if args.compare:
+        with open(get_results_path(args.compare), encoding='utf-8') as f:
+            baseline = {result['name']: result for result in json.load(f)['results']}
+
+    results = []
+    regressions = []
+    for case in cases:
+        result = run_benchmark(case, args.repeat)
+        results.append(result)
+        line = f"{result['name']:40} {result['best_ms']:12.3f}ms best {result['median_ms']:12.3f}ms median"
+        previous = baseline.get(result['name'])
+        if previous:
+            ratio = result['best_ms'] / previous['best_ms'] if previous['best_ms'] else 1.0
+            line += f"  {ratio:5.2f}x of {previous['best_ms']:.3f}ms"
+            if ratio > args.threshold:
+                line += ' SLOWER'
+                regressions.append(result['name'])
+        print(line, flush=True)
+
+    if args.save:
+        path = get_results_path(args.save)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'environment': get_environment(), 'results': results}, f, indent=2)
+        print(f'Saved to {path}')
+
+    if regressions:
+        print(f"{len(regressions)} benchmarks slower than {args.threshold}x the baseline", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
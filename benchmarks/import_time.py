@@ -0,0 +1,102 @@
+"""Guards the import cost of scrapy_gui.
+
+Each check runs in a fresh interpreter, reports the median wall time over a
+few runs and fails if a module that should be deferred gets imported or the
+time goes over budget.
+
+    python benchmarks/import_time.py
+"""
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHECKS = [
+    {
+        'name': 'package',
+        'code': 'import scrapy_gui',
+        'forbidden': ['PyQt5', 'parsel', 'bs4'],
+        'budget_ms': 50,
+    },
+    {
+        'name': 'engine',
+        'code': 'import scrapy_gui.engine',
+        'forbidden': ['PyQt5', 'bs4'],
+        'budget_ms': 400,
+    },
+    {
+        'name': 'load_selector',
+        'code': 'from scrapy_gui import load_selector',
+        'forbidden': ['PyQt5.QtWebEngineWidgets', 'bs4'],
+        'budget_ms': 1500,
+    },
+]
+
+PROBE = """
+import sys, time
+started = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - started
+print(repr((elapsed, sorted(sys.modules))))
+"""
+
+
+def run_check(check, repeat):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [ROOT, env.get('PYTHONPATH')]))
+    env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    timings = []
+    modules = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, '-c', PROBE.format(code=check['code'])],
+            env=env,
+            check=True,
+            stdout=subprocess.PIPE,
+            universal_newlines=True,
+        ).stdout
+        elapsed, modules = ast.literal_eval(output)
+        timings.append(elapsed * 1000)
+
+    loaded = [name for name in check['forbidden'] if name in modules]
+    median = statistics.median(timings)
+    return {
+        'name': check['name'],
+        'median_ms': round(median, 2),
+        'budget_ms': check['budget_ms'],
+        'loaded_forbidden': loaded,
+        'passed': not loaded and median <= check['budget_ms'],
+    }
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('-n', '--repeat', type=int, default=5)
+    arg_parser.add_argument('--scale', type=float, default=1.0, help='multiply every time budget, for slow machines')
+    arg_parser.add_argument('--json', action='store_true', help='print results as json')
+    args = arg_parser.parse_args(argv)
+
+    results = []
+    for check in CHECKS:
+        check = dict(check, budget_ms=check['budget_ms'] * args.scale)
+        results.append(run_check(check, args.repeat))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for result in results:
+            status = 'ok' if result['passed'] else 'FAIL'
+            line = f"{status:4} {result['name']:15} {result['median_ms']:8.1f}ms (budget {result['budget_ms']:.0f}ms)"
+            if result['loaded_forbidden']:
+                line += f" imported {', '.join(result['loaded_forbidden'])}"
+            print(line)
+    return 0 if all(result['passed'] for result in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,2 +1,19 @@
-from .load_selector import load_selector
-from .browser import open_browser
+# the UI entry points are imported on first use so the query engine can be
+# used without pulling in Qt
+__all__ = ['load_selector', 'open_browser']
+
+
+def __getattr__(name):
+    if name == 'load_selector':
+        from .load_selector import load_selector as function
+    elif name == 'open_browser':
+        from .browser import open_browser as function
+    else:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    # importing the load_selector module sets it as an attribute, so replace it
+    globals()[name] = function
+    return function
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,198 @@
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from .engine import load_document, plain
+from .export import BatchWriter, get_format, open_export
+from .utils_ui.session import read_document
+from .utils_ui import errors
+
+CONTEXT = multiprocessing.get_context('spawn')
+PAGE_PATTERNS = ('*.html', '*.htm')
+# how often a batch that can be stopped checks whether it has been
+STOP_INTERVAL = 0.1
+
+
+def normalise_query_set(queries):
+    query_set = {}
+    for name, spec in queries.items():
+        if isinstance(spec, str):
+            spec = {'query': spec}
+        query_set[name] = {
+            'query': spec['query'],
+            'type': spec.get('type', 'css'),
+            'regex': spec.get('regex') or None,
+            'function': spec.get('function') or None,
+        }
+    return query_set
+
+
+def load_query_set(path):
+    with open(path, encoding='utf-8') as f:
+        queries = json.load(f)
+    return normalise_query_set(queries)
+
+
+def save_query_set(path, queries):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(queries, f, indent=2)
+
+
+def find_pages(patterns):
+    pages = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for page_pattern in PAGE_PATTERNS:
+                pages.update(glob.glob(os.path.join(pattern, '**', page_pattern), recursive=True))
+        else:
+            pages.update(glob.glob(pattern, recursive=True))
+    return sorted(pages)
+
+
+def run_page(path, queries, keep_results=True):
+    started = time.perf_counter()
+    text = read_document(path)
+    parser = load_document(text)
+    selector = parser.selector
+    parse_time = time.perf_counter() - started
+
+    fields = {}
+    for name, spec in queries.items():
+        field_started = time.perf_counter()
+        error = None
+        try:
+            results = parser.do_query(
+                spec['query'],
+                spec['type'],
+                selector,
+                spec['regex'],
+                spec['function'],
+            )
+        except errors.QueryError as e:
+            results = []
+            # empty results are a count of zero rather than a failure
+            if e.error_type != 'info':
+                error = e.title
+        field = {
+            'count': len(results),
+            'time': time.perf_counter() - field_started,
+            'error': error,
+        }
+        if keep_results:
+            field['results'] = [plain(result) for result in results]
+        fields[name] = field
+
+    return {
+        'page': path,
+        'parse_time': parse_time,
+        'time': time.perf_counter() - started,
+        'error': None,
+        'fields': fields,
+    }
+
+
+def iter_batch(pages, queries, workers=None, keep_results=True, stop=None):
+    # results are yielded as each page finishes, not in the order given.
+    # once stop is set the pages not started yet are cancelled, without
+    # waiting for the next page to finish first
+    def stopped():
+        return stop is not None and stop.is_set()
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=CONTEXT) as executor:
+        futures = {
+            executor.submit(run_page, page, queries, keep_results): page
+            for page in pages
+        }
+        pending = set(futures)
+        try:
+            while pending and not stopped():
+                done, pending = wait(
+                    pending,
+                    timeout=STOP_INTERVAL if stop is not None else None,
+                    return_when=FIRST_COMPLETED,
+                )
+                for future in done:
+                    try:
+                        yield future.result()
+                    except Exception as e:
+                        yield {
+                            'page': futures[future],
+                            'parse_time': None,
+                            'time': None,
+                            'error': f'{type(e).__name__}: {e}',
+                            'fields': {},
+                        }
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+def has_errors(record):
+    return bool(record['error']) or any(field['error'] for field in record['fields'].values())
+
+
+def summarise(records, queries):
+    summary = {}
+    for name in queries:
+        fields = [record['fields'][name] for record in records if name in record['fields']]
+        summary[name] = {
+            'pages': len(fields),
+            'hits': sum(1 for field in fields if field['count']),
+            'errors': sum(1 for field in fields if field['error']),
+            'results': sum(field['count'] for field in fields),
+            'mean_time': sum(field['time'] for field in fields) / len(fields) if fields else 0,
+        }
+    return summary
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(
+        prog='scrapy-gui-batch',
+        description='Run a set of queries against many saved html pages',
+    )
+    arg_parser.add_argument('queries', help='json file of named queries')
+    arg_parser.add_argument('pages', nargs='+', help='html files, directories or glob patterns')
+    arg_parser.add_argument('-w', '--workers', type=int, default=None, help='number of worker processes')
+    arg_parser.add_argument('-o', '--output', default='-', help='output file, csv when it ends in .csv, otherwise json lines, default stdout')
+    arg_parser.add_argument('--counts-only', action='store_true', help='leave extracted values out of the output')
+    args = arg_parser.parse_args(argv)
+
+    queries = load_query_set(args.queries)
+    pages = find_pages(args.pages)
+    if not pages:
+        arg_parser.error('no pages found')
+
+    if args.output == '-':
+        output = sys.stdout
+        writer = BatchWriter(output, 'jsonl')
+    else:
+        output = open_export(args.output)
+        writer = BatchWriter(output, get_format(args.output))
+    records = []
+    failed = False
+    try:
+        for record in iter_batch(pages, queries, args.workers, not args.counts_only):
+            writer.write(record)
+            records.append({'fields': record['fields']})
+            failed = failed or has_errors(record)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    for name, field in summarise(records, queries).items():
+        print(
+            f"{name}: {field['hits']}/{field['pages']} pages, {field['results']} results, "
+            f"{field['errors']} errors, {field['mean_time'] * 1000:.2f}ms mean",
+            file=sys.stderr,
+        )
+    # like scrapy-gui-query, a page or field that failed is a failed run
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
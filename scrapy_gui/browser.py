@@ -1,11 +1,18 @@
 from PyQt5.QtWidgets import *
 
-from parsel import Selector
-import requests
-
 from .utils_ui.text_viewer import TextViewer
+from .utils_ui import errors
 from .browser_window.browser import QtBrowser
+from .browser_window.fetcher import SourceFetcher
 from .utils_ui.tools_tab_ui import Queries
+from .utils_ui.batch_tab_ui import BatchQueries
+from .utils_ui.pipeline_tab_ui import Pipeline
+from .utils_ui.documents_tab_ui import Documents
+from .utils_ui.snapshots_tab_ui import Snapshots
+from .utils_ui.profiler_tab_ui import Profiler
+from .utils_ui.advisor_tab_ui import Advisor
+from .utils_ui.tree_tab_ui import DomTree
+from .utils_ui.rendered_tab_ui import RenderedDiff
 import sys
 
 
@@ -17,12 +24,32 @@ class Main(QMainWindow):
     def init_ui(self):
         self.setWindowTitle('Scrapy GUI - Browser')
         tabs = QTabWidget()
+        self.fetcher = SourceFetcher(self)
+        self.fetcher.fetched.connect(self.set_source)
+        self.fetcher.failed.connect(self.fetch_failed)
         self.browser = QtBrowser(main=self)
+        self.fetcher.share_profile(self.browser.web.page().profile())
         self.queries = Queries(main=self)
+        self.batch = BatchQueries(main=self)
+        self.pipeline = Pipeline(main=self)
+        self.documents = Documents(main=self)
+        self.snapshots = Snapshots(main=self)
+        self.profiler = Profiler(main=self)
+        self.advisor = Advisor(main=self)
+        self.tree = DomTree(main=self)
+        self.rendered = RenderedDiff(main=self)
         self.source_viewer = TextViewer()
         self.notes = QPlainTextEdit()
         tabs.addTab(self.browser, 'Browser')
         tabs.addTab(self.queries, 'Tools')
+        tabs.addTab(self.batch, 'Batch')
+        tabs.addTab(self.pipeline, 'Pipeline')
+        tabs.addTab(self.documents, 'Documents')
+        tabs.addTab(self.snapshots, 'Snapshots')
+        tabs.addTab(self.profiler, 'Profiler')
+        tabs.addTab(self.advisor, 'Advisor')
+        tabs.addTab(self.tree, 'Tree')
+        tabs.addTab(self.rendered, 'Rendered')
         tabs.addTab(self.source_viewer, 'Source')
         tabs.addTab(self.notes, 'Notes')
         self.setCentralWidget(tabs)
@@ -31,11 +58,27 @@ class Main(QMainWindow):
     def update_source(self, url):
         # pyqt5 webengine has the final html including manipulation from javascript, etc
         # for scraping with scrapy the first one matters, so will get again
-        response = requests.get(url)
-        html = response.text
-        selector = Selector(text=html)
+        self.fetcher.fetch(url)
+        self.rendered.page_loaded()
+
+    def set_source(self, url, html, headers, body):
+        self.snapshots.save(url, body, headers)
+        selector = self.documents.add_document(url, html)
+        self.show_document(selector, html)
+
+    def show_document(self, selector, html):
         self.queries.update_source(selector)
-        self.source_viewer.setPrettyHtml(html)
+        self.tree.setSource(selector)
+        self.browser.picker_panel.set_source(selector)
+        self.source_viewer.setSource(selector, html)
+
+    def fetch_failed(self, url, message):
+        errors.show_error_dialog(
+            self,
+            'Fetch Error',
+            f'Could not get the source for\n{url}\n\n{message}',
+            'critical',
+        )
 
 
 def open_browser():
@@ -5,6 +5,8 @@ from PyQt5.QtWebEngineWidgets import QWebEngineView
 
 import os
 
+from .picker import ElementPicker, PickerPanel
+
 HOME = 'http://quotes.toscrape.com/'
 
 
@@ -27,8 +29,25 @@ class QtBrowser(QWidget):
         self.entry_box.returnPressed.connect(self.go_button.click)
         grid.addWidget(self.entry_box, 0, 2)
 
+        self.pick_button = QPushButton('Pick')
+        self.pick_button.setCheckable(True)
+        self.pick_button.setToolTip('Hover over elements in the page to get selectors for them')
+        self.pick_button.toggled.connect(self.toggle_picker)
+        grid.addWidget(self.pick_button, 0, 5)
+
+        splitter = QSplitter(Qt.Vertical)
         self.web = QWebEngineView()
-        grid.addWidget(self.web, 1, 0, 1, 5)
+        splitter.addWidget(self.web)
+        self.picker_panel = PickerPanel(main=self.main)
+        self.picker_panel.hide()
+        splitter.addWidget(self.picker_panel)
+        splitter.setStretchFactor(0, 3)
+        splitter.setStretchFactor(1, 1)
+        grid.addWidget(splitter, 1, 0, 1, 6)
+
+        self.picker = ElementPicker(self.web.page(), self)
+        self.picker.bridge.hovered.connect(self.picker_panel.request)
+        self.picker.bridge.picked.connect(self.element_picked)
         self.web.urlChanged.connect(self.update_url)
         self.web.loadStarted.connect(self.load_started)
         self.web.loadFinished.connect(self.load_finished)
@@ -50,6 +69,15 @@ class QtBrowser(QWidget):
         self.movie.setMaximumWidth(20)
         grid.addWidget(self.movie, 0, 4)
 
+    def toggle_picker(self, checked):
+        self.picker.set_enabled(checked)
+        if checked:
+            self.picker_panel.show()
+
+    def element_picked(self, steps):
+        self.picker_panel.request(steps, immediate=True)
+        self.pick_button.setChecked(False)
+
     def go_to_page(self):
         entered_page = self.entry_box.text()
         if not entered_page.startswith('http'):
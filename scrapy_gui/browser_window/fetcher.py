@@ -0,0 +1,97 @@
+from PyQt5.QtCore import *
+from PyQt5.QtNetwork import *
+
+from w3lib.encoding import html_to_unicode
+
+import os
+
+
+def get_cache_dir():
+    location = QStandardPaths.writableLocation(QStandardPaths.CacheLocation)
+    return os.path.join(location, 'scrapy_gui', 'http')
+
+
+class SourceFetcher(QObject):
+    fetched = pyqtSignal(str, str, dict, bytes)
+    failed = pyqtSignal(str, str)
+
+    timeout = 30
+    cache_size = 200 * 1024 * 1024
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # one manager for the whole session so connections are kept alive and reused
+        self.manager = QNetworkAccessManager(self)
+        self.manager.setRedirectPolicy(QNetworkRequest.NoLessSafeRedirectPolicy)
+        # the disk cache revalidates with ETag/Last-Modified so revisits are cheap
+        cache = QNetworkDiskCache(self)
+        cache.setCacheDirectory(get_cache_dir())
+        cache.setMaximumCacheSize(self.cache_size)
+        self.manager.setCache(cache)
+        self.user_agent = None
+        self.reply = None
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.timed_out)
+
+    def share_profile(self, profile):
+        # match what the browser sent so the raw html is the same page the user sees
+        self.user_agent = profile.httpUserAgent()
+        cookie_store = profile.cookieStore()
+        cookie_store.cookieAdded.connect(self.add_cookie)
+        cookie_store.cookieRemoved.connect(self.remove_cookie)
+        cookie_store.loadAllCookies()
+
+    def add_cookie(self, cookie):
+        self.manager.cookieJar().insertCookie(cookie)
+
+    def remove_cookie(self, cookie):
+        self.manager.cookieJar().deleteCookie(cookie)
+
+    def fetch(self, url):
+        self.abort()
+        request = QNetworkRequest(QUrl(url))
+        if self.user_agent:
+            request.setHeader(QNetworkRequest.UserAgentHeader, self.user_agent)
+        self.reply = self.manager.get(request)
+        self.reply.finished.connect(self.reply_finished)
+        self.timer.start(self.timeout * 1000)
+
+    def abort(self):
+        # only the newest page matters, older requests are dropped
+        self.timer.stop()
+        if self.reply is not None:
+            reply = self.reply
+            self.reply = None
+            reply.finished.disconnect(self.reply_finished)
+            reply.abort()
+            reply.deleteLater()
+
+    def timed_out(self):
+        url = self.reply.url().toString()
+        self.abort()
+        self.failed.emit(url, f'No response after {self.timeout} seconds')
+
+    def reply_finished(self):
+        self.timer.stop()
+        reply = self.reply
+        self.reply = None
+        url = reply.url().toString()
+        status = reply.attribute(QNetworkRequest.HttpStatusCodeAttribute)
+        # error pages still have a body worth querying, only a missing response fails
+        if status is None and reply.error() != QNetworkReply.NoError:
+            self.failed.emit(url, reply.errorString())
+            reply.deleteLater()
+            return
+
+        body = bytes(reply.readAll())
+        content_type = reply.header(QNetworkRequest.ContentTypeHeader)
+        _, html = html_to_unicode(content_type, body)
+        headers = {
+            bytes(name).decode('latin-1'): bytes(value).decode('latin-1')
+            for name, value in reply.rawHeaderPairs()
+        }
+        if status is not None:
+            headers['Status'] = str(status)
+        reply.deleteLater()
+        self.fetched.emit(url, html, headers, body)
@@ -0,0 +1,306 @@
+from PyQt5.QtWidgets import *
+from PyQt5.QtCore import *
+from PyQt5.QtGui import *
+from PyQt5.QtWebChannel import QWebChannel
+from PyQt5.QtWebEngineWidgets import QWebEngineScript
+
+import json
+
+from ..utils_ui.runner import QueryRunner
+from ..utils_ui.worker import get_text
+from ..utils_ui import errors
+
+# runs in its own javascript world so the page's scripts can't see or break it
+PICKER_SCRIPT = """
+(function () {
+    if (window.scrapyGuiPicker) {
+        return;
+    }
+    var bridge = null;
+    var enabled = false;
+    var hovered = null;
+    var frame = null;
+    var overlay = document.createElement('div');
+    overlay.style.cssText = 'position: fixed; pointer-events: none; z-index: 2147483647; ' +
+        'outline: 2px solid #e0383e; background: rgba(224, 56, 62, 0.15); display: none;';
+
+    function describe(element) {
+        var steps = [];
+        for (; element && element.nodeType === 1; element = element.parentElement) {
+            var tag = element.localName;
+            var index = 1;
+            var count = 1;
+            if (element.parentElement) {
+                var siblings = element.parentElement.children;
+                count = 0;
+                for (var i = 0; i < siblings.length; i++) {
+                    if (siblings[i].localName === tag) {
+                        count++;
+                        if (siblings[i] === element) {
+                            index = count;
+                        }
+                    }
+                }
+            }
+            steps.unshift({
+                tag: tag,
+                id: element.getAttribute('id') || '',
+                classes: element.getAttribute('class') || '',
+                index: index,
+                count: count
+            });
+        }
+        return JSON.stringify(steps);
+    }
+
+    function outline(element) {
+        var rect = element.getBoundingClientRect();
+        overlay.style.left = rect.left + 'px';
+        overlay.style.top = rect.top + 'px';
+        overlay.style.width = rect.width + 'px';
+        overlay.style.height = rect.height + 'px';
+        overlay.style.display = 'block';
+    }
+
+    function sendHover() {
+        // one message per frame however fast the mouse moves
+        frame = null;
+        if (enabled && hovered && bridge) {
+            bridge.element_hovered(describe(hovered));
+        }
+    }
+
+    function onMouseOver(event) {
+        if (!enabled || event.target === overlay) {
+            return;
+        }
+        hovered = event.target;
+        outline(hovered);
+        if (frame === null) {
+            frame = window.requestAnimationFrame(sendHover);
+        }
+    }
+
+    function onClick(event) {
+        if (!enabled) {
+            return;
+        }
+        event.preventDefault();
+        event.stopPropagation();
+        if (bridge) {
+            bridge.element_picked(describe(event.target));
+        }
+    }
+
+    function setEnabled(value) {
+        // the overlay is only in the page while picking, so it isn't in captured html
+        enabled = value;
+        if (enabled) {
+            document.documentElement.appendChild(overlay);
+        } else {
+            overlay.style.display = 'none';
+            overlay.remove();
+            hovered = null;
+        }
+    }
+
+    document.addEventListener('mouseover', onMouseOver, true);
+    document.addEventListener('click', onClick, true);
+    window.scrapyGuiPicker = {setEnabled: setEnabled};
+
+    new QWebChannel(qt.webChannelTransport, function (channel) {
+        bridge = channel.objects.scrapyGui;
+        bridge.is_enabled(setEnabled);
+    });
+})();
+"""
+
+
+def read_resource(path):
+    resource = QFile(path)
+    if not resource.open(QIODevice.ReadOnly):
+        return ''
+    try:
+        return bytes(resource.readAll()).decode('utf-8')
+    finally:
+        resource.close()
+
+
+class PickerBridge(QObject):
+    hovered = pyqtSignal(list)
+    picked = pyqtSignal(list)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.enabled = False
+
+    @pyqtSlot(result=bool)
+    def is_enabled(self):
+        return self.enabled
+
+    @pyqtSlot(str)
+    def element_hovered(self, steps):
+        self.hovered.emit(json.loads(steps))
+
+    @pyqtSlot(str)
+    def element_picked(self, steps):
+        self.picked.emit(json.loads(steps))
+
+
+class ElementPicker(QObject):
+    def __init__(self, page, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.page = page
+        self.bridge = PickerBridge(self)
+        self.channel = QWebChannel(self)
+        self.channel.registerObject('scrapyGui', self.bridge)
+        page.setWebChannel(self.channel, QWebEngineScript.ApplicationWorld)
+
+        script = QWebEngineScript()
+        script.setName('scrapy_gui_picker')
+        script.setSourceCode(read_resource(':/qtwebchannel/qwebchannel.js') + PICKER_SCRIPT)
+        script.setInjectionPoint(QWebEngineScript.DocumentReady)
+        script.setWorldId(QWebEngineScript.ApplicationWorld)
+        script.setRunsOnSubFrames(False)
+        page.scripts().insert(script)
+        page.loadFinished.connect(self.apply)
+
+    def set_enabled(self, enabled):
+        self.bridge.enabled = enabled
+        self.apply()
+
+    def apply(self):
+        # new pages also ask for the state when their channel connects
+        value = 'true' if self.bridge.enabled else 'false'
+        self.page.runJavaScript(
+            f'window.scrapyGuiPicker && window.scrapyGuiPicker.setEnabled({value});',
+            QWebEngineScript.ApplicationWorld,
+        )
+
+
+class PickerPanel(QWidget):
+    delay = 150
+    timeout = 10
+
+    def __init__(self, *args, main, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.main = main
+        self.source = None
+        self.loaded = None
+        self.pending = None
+        # candidates are checked in a worker against the html spiders get
+        self.runner = QueryRunner(self)
+        self.runner.finished.connect(self.pick_finished)
+        self.runner.failed.connect(self.pick_failed)
+        self.debounce = QTimer(self)
+        self.debounce.setSingleShot(True)
+        self.debounce.setInterval(self.delay)
+        self.debounce.timeout.connect(self.dispatch)
+        self.initUI()
+
+    def initUI(self):
+        grid = QGridLayout()
+        grid.setContentsMargins(0, 0, 0, 0)
+        self.setLayout(grid)
+
+        self.path_label = QLabel('Hover over an element to see selectors for it, click it to keep them')
+        self.path_label.setWordWrap(True)
+        grid.addWidget(self.path_label, 0, 0)
+
+        self.warning = QLabel()
+        self.warning.setWordWrap(True)
+        self.warning.setStyleSheet('color: #b00020')
+        self.warning.hide()
+        grid.addWidget(self.warning, 1, 0)
+
+        self.candidates = QTableWidget(0, 4)
+        self.candidates.setHorizontalHeaderLabels(['Query', 'Type', 'Matches', 'Selects Element'])
+        self.candidates.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.candidates.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.candidates.verticalHeader().hide()
+        self.candidates.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.candidates.setToolTip('Double click a query to use it in the Tools tab')
+        self.candidates.cellDoubleClicked.connect(self.use_candidate)
+        grid.addWidget(self.candidates, 2, 0)
+
+    def set_source(self, selector):
+        self.source = selector
+        self.pending = None
+        self.runner.cancel()
+        self.candidates.setRowCount(0)
+        self.warning.hide()
+
+    def request(self, steps, immediate=False):
+        # only the newest element is kept, a running check is left to finish
+        # so the worker keeps its parsed document
+        if self.source is None or not steps:
+            return
+        self.pending = steps
+        self.path_label.setText(' > '.join(step_label(step) for step in steps))
+        if immediate:
+            self.debounce.stop()
+            self.dispatch()
+        else:
+            self.debounce.start()
+
+    def dispatch(self):
+        if self.pending is None or self.runner.is_running():
+            return
+        if self.source is not self.loaded:
+            self.runner.load(get_text(self.source))
+            self.loaded = self.source
+        steps = self.pending
+        self.pending = None
+        self.runner.pick(steps, self.timeout)
+
+    def pick_finished(self, report):
+        if self.pending is None:
+            self.show_report(report)
+        self.dispatch()
+
+    def pick_failed(self, title, message, error_type):
+        if self.pending is None:
+            errors.show_error_dialog(self, title, message, error_type)
+        self.dispatch()
+
+    def show_report(self, report):
+        if report['differences']:
+            self.warning.setText('\n'.join(report['differences']))
+            self.warning.show()
+        else:
+            self.warning.hide()
+
+        self.candidates.setRowCount(0)
+        for candidate in report['candidates']:
+            row = self.candidates.rowCount()
+            self.candidates.insertRow(row)
+            query_item = QTableWidgetItem(candidate['query'])
+            query_item.setToolTip(candidate['error'] or candidate['label'])
+            self.candidates.setItem(row, 0, query_item)
+            self.candidates.setItem(row, 1, QTableWidgetItem(candidate['type']))
+            count_item = QTableWidgetItem()
+            if candidate['count'] is not None:
+                count_item.setData(Qt.DisplayRole, candidate['count'])
+            self.candidates.setItem(row, 2, count_item)
+            if candidate['error']:
+                selects = 'Error'
+            elif not candidate['selects']:
+                selects = 'No'
+            else:
+                selects = 'Unique' if candidate['count'] == 1 else 'Yes'
+            self.candidates.setItem(row, 3, QTableWidgetItem(selects))
+
+    def use_candidate(self, row, column):
+        query = self.candidates.item(row, 0).text()
+        query_type = self.candidates.item(row, 1).text()
+        self.main.queries.query_section.set_query(query, query_type)
+
+
+def step_label(step):
+    label = step['tag']
+    if step['id']:
+        label += f"#{step['id']}"
+    classes = step['classes'].split()
+    if classes:
+        label += '.' + '.'.join(classes)
+    return label
@@ -0,0 +1,83 @@
+import argparse
+import json
+import sys
+
+from parsel import Selector
+
+from .utils_ui.parser import Parser, fingerprint
+from .utils_ui import errors
+
+
+def load_document(text, document_type=None):
+    selector = Selector(text=text, type=document_type)
+    return Parser(selector, fingerprint(text))
+
+
+def run_query(text, query, query_type='css', regex=None, function=None, document_type=None):
+    parser = load_document(text, document_type)
+    return parser.do_query(query, query_type, parser.selector, regex, function)
+
+
+def iter_documents(paths, encoding='utf-8'):
+    for path in paths:
+        if path == '-':
+            yield '<stdin>', sys.stdin.read()
+        else:
+            with open(path, encoding=encoding, errors='replace') as f:
+                yield path, f.read()
+
+
+def plain(result):
+    # user functions can return anything, but results have to be pickled and dumped to json
+    if result is None or isinstance(result, (str, int, float, bool)):
+        return result
+    return str(result)
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(
+        prog='scrapy-gui-query',
+        description='Run a css or xpath query, with optional regex and function, without the UI',
+    )
+    arg_parser.add_argument('query', help='css or xpath query')
+    arg_parser.add_argument('files', nargs='*', default=['-'], help="html files, '-' or nothing for stdin")
+    arg_parser.add_argument('-x', '--xpath', action='store_true', help='treat the query as xpath')
+    arg_parser.add_argument('-r', '--regex', help='regular expression applied to the results')
+    arg_parser.add_argument('-f', '--function', help="file containing a 'user_fun(results, selector)' function")
+    arg_parser.add_argument('--xml', action='store_true', help='parse documents as xml')
+    arg_parser.add_argument('--flat', action='store_true', help='write one line per result instead of per document')
+    arg_parser.add_argument('--encoding', default='utf-8', help='encoding of the input files')
+    args = arg_parser.parse_intermixed_args(argv)
+
+    function = None
+    if args.function:
+        with open(args.function, encoding='utf-8') as f:
+            function = f.read()
+    query_type = 'xpath' if args.xpath else 'css'
+    document_type = 'xml' if args.xml else None
+
+    failed = False
+    for source, text in iter_documents(args.files, args.encoding):
+        try:
+            results = run_query(text, args.query, query_type, args.regex, function, document_type)
+        except errors.QueryError as e:
+            # empty results are normal output, anything else is a failure
+            results = []
+            if e.error_type != 'info':
+                failed = True
+                record = {'source': source, 'error': e.title, 'message': e.message}
+                sys.stdout.write(json.dumps(record) + '\n')
+                continue
+
+        results = [plain(result) for result in results]
+        if args.flat:
+            for result in results:
+                sys.stdout.write(json.dumps({'source': source, 'result': result}) + '\n')
+        else:
+            record = {'source': source, 'count': len(results), 'results': results}
+            sys.stdout.write(json.dumps(record) + '\n')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,122 @@
+import csv
+import json
+import re
+
+from .engine import plain
+
+RESULT_FIELDS = ['result']
+BATCH_FIELDS = ['page', 'field', 'index', 'result', 'error']
+
+
+def get_format(path):
+    return 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+
+def open_export(path):
+    # csv needs newline='' so the writer controls line endings
+    return open(path, 'w', encoding='utf-8', newline='')
+
+
+class RowWriter:
+    # writes one row at a time so nothing has to be held in memory first
+    def __init__(self, file, export_format, fieldnames):
+        self.file = file
+        self.export_format = export_format
+        if export_format == 'csv':
+            self.writer = csv.DictWriter(file, fieldnames, extrasaction='ignore')
+            self.writer.writeheader()
+
+    def write(self, row):
+        if self.export_format == 'csv':
+            self.writer.writerow(row)
+        else:
+            self.file.write(json.dumps(row, default=str) + '\n')
+
+
+def export_results(path, results):
+    with open_export(path) as f:
+        writer = RowWriter(f, get_format(path), RESULT_FIELDS)
+        for result in results:
+            writer.write({'result': plain(result)})
+
+
+def batch_rows(record):
+    # one row per extracted value, fields and pages without any still get a row
+    if record['error']:
+        yield {'page': record['page'], 'error': record['error']}
+        return
+    for name, field in record['fields'].items():
+        results = field.get('results') or []
+        if field['error'] or not results:
+            yield {'page': record['page'], 'field': name, 'error': field['error']}
+        for index, result in enumerate(results):
+            yield {'page': record['page'], 'field': name, 'index': index, 'result': result}
+
+
+class BatchWriter:
+    def __init__(self, file, export_format):
+        self.file = file
+        self.rows = RowWriter(file, export_format, BATCH_FIELDS)
+
+    def write(self, record):
+        if self.rows.export_format == 'csv':
+            for row in batch_rows(record):
+                self.rows.write(row)
+        else:
+            # json lines keep the whole record for each page, as the batch command always has
+            self.rows.write(record)
+        self.file.flush()
+
+
+def python_string(value):
+    # raw strings keep regexes readable, repr covers anything a raw string can't hold
+    if "'" not in value and '\n' not in value and not value.endswith('\\') and '\\' in value:
+        return f"r'{value}'"
+    return repr(value)
+
+
+def query_code(query, query_type, regex=None, target='sel'):
+    code = f'{target}.{query_type}({python_string(query)})'
+    if regex:
+        return code + f'.re({python_string(regex)})'
+    return code + '.getall()'
+
+
+def function_name(name):
+    name = re.sub(r'\W', '_', name).strip('_') or 'field'
+    if name[0].isdigit():
+        name = f'field_{name}'
+    return f'{name}_fun'
+
+
+def parse_code(queries):
+    functions = []
+    lines = [
+        '    def parse(self, response):',
+        '        loader = ItemLoader(item={}, response=response)',
+    ]
+    for name, spec in queries.items():
+        method = 'css' if spec['type'] == 'css' else 'xpath'
+        arguments = [python_string(spec['query'])]
+        if spec.get('regex'):
+            arguments.append(f"re={python_string(spec['regex'])}")
+
+        function = spec.get('function')
+        if function:
+            fun_name = function_name(name)
+            functions.append(function.replace('def user_fun(', f'def {fun_name}(', 1).strip())
+            values = f"loader.get_{method}({', '.join(arguments)})"
+            lines.append(f'        loader.add_value({python_string(name)}, {fun_name}({values}, response))')
+        else:
+            lines.append(f"        loader.add_{method}({python_string(name)}, {', '.join(arguments)})")
+    lines.append('        yield loader.load_item()')
+
+    sections = ['import scrapy\nfrom scrapy.loader import ItemLoader']
+    sections.extend(functions)
+    sections.append('class QuerySetSpider(scrapy.Spider):\n    name = \'query_set\'\n\n' + '\n'.join(lines))
+    return '\n\n\n'.join(sections) + '\n'
+
+
+def export_parse_code(path, queries):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(parse_code(queries))
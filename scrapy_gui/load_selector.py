@@ -1,10 +1,24 @@
 from PyQt5.QtWidgets import *
+from PyQt5.QtCore import *
 
+from .snapshots import plain_headers
 from .utils_ui.text_viewer import TextViewer
 from .utils_ui.tools_tab_ui import Queries
+from .utils_ui.batch_tab_ui import BatchQueries
+from .utils_ui.pipeline_tab_ui import Pipeline
+from .utils_ui.documents_tab_ui import Documents
+from .utils_ui.snapshots_tab_ui import Snapshots
+from .utils_ui.profiler_tab_ui import Profiler
+from .utils_ui.advisor_tab_ui import Advisor
+from .utils_ui.tree_tab_ui import DomTree
+from .utils_ui.worker import get_text, CONTEXT
 
+import atexit
 import sys
 
+SHELL_APP = None
+SHELL_WINDOW = None
+
 
 class MiniUI(QMainWindow):
     def __init__(self, *args, **kwargs):
@@ -15,22 +29,176 @@ class MiniUI(QMainWindow):
         self.setWindowTitle('Scrapy GUI')
         tabs = QTabWidget()
         self.queries = Queries(main=self)
+        self.batch = BatchQueries(main=self)
+        self.pipeline = Pipeline(main=self)
+        self.documents = Documents(main=self)
+        self.snapshots = Snapshots(main=self)
+        self.profiler = Profiler(main=self)
+        self.advisor = Advisor(main=self)
+        self.tree = DomTree(main=self)
         self.source_viewer = TextViewer()
         self.notes = QPlainTextEdit()
         tabs.addTab(self.queries, 'Tools')
+        tabs.addTab(self.batch, 'Batch')
+        tabs.addTab(self.pipeline, 'Pipeline')
+        tabs.addTab(self.documents, 'Documents')
+        tabs.addTab(self.snapshots, 'Snapshots')
+        tabs.addTab(self.profiler, 'Profiler')
+        tabs.addTab(self.advisor, 'Advisor')
+        tabs.addTab(self.tree, 'Tree')
         tabs.addTab(self.source_viewer, 'Source')
         tabs.addTab(self.notes, 'Notes')
         self.setCentralWidget(tabs)
 
     def add_selector(self, selector):
+        self.add_page(*page_details(selector), selector)
+
+    def add_page(self, url, text, body=None, headers=None, selector=None):
+        url = url or f'Selector {len(self.documents.store) + 1}'
+        self.snapshots.save(url, body or text.encode('utf-8'), headers)
+        selector = self.documents.add_document(url, text, selector)
+        self.show_document(selector, text)
+
+    def show_document(self, selector, text):
         self.queries.update_source(selector)
-        self.source_viewer.setPrettyHtml(selector.text)
+        self.tree.setSource(selector)
+        self.source_viewer.setSource(selector, text)
 
 
-def load_selector(selector):
-    print('Shell UI window opened - Close window to regain use of shell')
+class PageReceiver(QObject):
+    poll_interval = 20
+
+    def __init__(self, connection, main, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.connection = connection
+        self.main = main
+        self.timer = QTimer(self)
+        self.timer.setInterval(self.poll_interval)
+        self.timer.timeout.connect(self.check)
+        self.timer.start()
+
+    def check(self):
+        try:
+            while self.connection.poll():
+                command, payload = self.connection.recv()
+                if command == 'load':
+                    self.main.add_page(*payload)
+                    self.main.show()
+                    self.main.raise_()
+                    self.main.activateWindow()
+                elif command == 'quit':
+                    QApplication.quit()
+        except (EOFError, OSError):
+            # the shell has gone, so the window goes too
+            QApplication.quit()
+
+
+def serve_window(connection):
     app = QApplication(sys.argv)
     main = MiniUI()
+    receiver = PageReceiver(connection, main)
+    app.exec_()
+
+
+class WindowProcess:
+    # a window in its own process that stays open between load_selector calls,
+    # so only the first call pays for starting Qt and building the window
+    def __init__(self):
+        self.process = None
+        self.connection = None
+        self.exit_registered = False
+
+    def is_alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    def start(self):
+        self.connection, child_connection = CONTEXT.Pipe()
+        # not a daemon, as the window starts its own query workers
+        self.process = CONTEXT.Process(target=serve_window, args=(child_connection,))
+        self.process.start()
+        child_connection.close()
+        if not self.exit_registered:
+            # registered after multiprocessing's own exit handler, so it runs first
+            # and the shell doesn't wait for the window to be closed
+            atexit.register(self.close)
+            self.exit_registered = True
+
+    def send(self, selector):
+        page = page_details(selector)
+        if not self.is_alive():
+            print('Shell UI window opened in the background - the shell can still be used')
+            self.start()
+        try:
+            self.connection.send(('load', page))
+        except OSError:
+            # the window was closed between the check and the send
+            self.start()
+            self.connection.send(('load', page))
+
+    def close(self):
+        if not self.is_alive():
+            return
+        try:
+            self.connection.send(('quit', None))
+        except OSError:
+            pass
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+WINDOW_PROCESS = WindowProcess()
+
+
+def page_details(selector):
+    text = get_text(selector)
+    # responses keep the bytes that were downloaded, plain selectors only have text
+    body = getattr(selector, 'body', None)
+    return getattr(selector, 'url', None), text, body, plain_headers(getattr(selector, 'headers', None))
+
+
+def enable_shell_gui():
+    # ipython can run the Qt event loop while it waits for input
+    try:
+        from IPython import get_ipython
+    except ImportError:
+        return False
+    shell = get_ipython()
+    if shell is None:
+        return False
+    if str(getattr(shell, 'active_eventloop', None)).startswith('qt'):
+        return True
+    try:
+        shell.enable_gui('qt5')
+    except Exception:
+        # terminals and kernels without Qt support raise their own errors
+        return False
+    return True
+
+
+def show_in_shell(selector):
+    global SHELL_APP, SHELL_WINDOW
+    SHELL_APP = QApplication.instance() or QApplication(sys.argv)
+    if SHELL_WINDOW is None:
+        SHELL_WINDOW = MiniUI()
+    SHELL_WINDOW.add_selector(selector)
+    SHELL_WINDOW.show()
+    SHELL_WINDOW.raise_()
+
+
+def load_selector(selector, wait=True):
+    if not wait:
+        # the window is reused by later calls, in the shell's own event loop
+        # under ipython and in a separate process otherwise
+        if enable_shell_gui():
+            show_in_shell(selector)
+        else:
+            WINDOW_PROCESS.send(selector)
+        return
+
+    print('Shell UI window opened - Close window to regain use of shell')
+    app = QApplication.instance() or QApplication(sys.argv)
+    main = MiniUI()
     main.add_selector(selector)
     main.show()
     app.exec_()
@@ -0,0 +1,225 @@
+from datetime import datetime
+import gzip
+import hashlib
+import json
+import mmap
+import os
+import tempfile
+import zlib
+
+from parsel import Selector
+from w3lib.encoding import html_to_unicode
+
+try:
+    import zstandard
+except ImportError:
+    # zstd is optional, gzip is always available
+    zstandard = None
+
+INDEX_NAME = 'index.jsonl'
+EXTENSIONS = {'zstd': '.zst', 'gzip': '.gz'}
+
+
+def get_snapshot_dir():
+    return os.environ.get('SCRAPY_GUI_SNAPSHOTS') or os.path.join(os.path.expanduser('~'), '.scrapy_gui', 'snapshots')
+
+
+def default_compression():
+    return 'zstd' if zstandard is not None else 'gzip'
+
+
+def compress(body, compression):
+    if compression == 'zstd':
+        return zstandard.ZstdCompressor(level=10).compress(body)
+    return gzip.compress(body, compresslevel=6)
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def decompress(data, compression):
+    if compression == 'zstd':
+        if zstandard is None:
+            raise RuntimeError('This snapshot is compressed with zstd, install the zstandard package to open it')
+        try:
+            return zstandard.ZstdDecompressor().decompress(data)
+        except zstandard.ZstdError as e:
+            raise SnapshotError(f'The snapshot is damaged\n\n{e}')
+    try:
+        return gzip.decompress(data)
+    except (OSError, EOFError, zlib.error) as e:
+        # a bad header, a cut short file or a bad block
+        raise SnapshotError(f'The snapshot is damaged\n\n{e}')
+
+
+def read_blob(path, compression):
+    # the compressed file is mapped rather than read, so it is only copied
+    # once, by the decompressor
+    with open(path, 'rb') as f:
+        if not os.fstat(f.fileno()).st_size:
+            return b''
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return decompress(data, compression)
+
+
+def plain_headers(headers):
+    # scrapy headers are bytes with a list of values each, fetched ones are str
+    plain = {}
+    for name, value in (headers or {}).items():
+        if isinstance(value, (list, tuple)):
+            value = b', '.join(value) if value and isinstance(value[0], bytes) else ', '.join(value)
+        if isinstance(name, bytes):
+            name = name.decode('latin-1')
+        if isinstance(value, bytes):
+            value = value.decode('latin-1')
+        plain[name] = value
+    return plain
+
+
+def get_header(headers, name):
+    name = name.lower()
+    return next((value for key, value in headers.items() if key.lower() == name), None)
+
+
+class Snapshot:
+    def __init__(self, id, url, time, blob, size, stored_size, compression, headers=None):
+        self.id = id
+        self.url = url
+        self.time = time
+        self.blob = blob
+        self.size = size
+        self.stored_size = stored_size
+        self.compression = compression
+        self.headers = headers or {}
+
+    def to_dict(self):
+        return dict(vars(self))
+
+    @classmethod
+    def from_dict(cls, record):
+        return cls(**record)
+
+
+class SnapshotStore:
+    # bodies are stored once each under the hash of their bytes, the index
+    # is a json line per snapshot so saving one never rewrites the others
+    def __init__(self, directory=None, compression=None):
+        self.directory = directory or get_snapshot_dir()
+        self.compression = compression or default_compression()
+        self.snapshots = {}
+        os.makedirs(os.path.join(self.directory, 'objects'), exist_ok=True)
+        self.index_path = os.path.join(self.directory, INDEX_NAME)
+        self.load_index()
+
+    def __len__(self):
+        return len(self.snapshots)
+
+    def __iter__(self):
+        return iter(list(self.snapshots.values()))
+
+    def __contains__(self, snapshot_id):
+        return snapshot_id in self.snapshots
+
+    def load_index(self):
+        self.snapshots = {}
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, encoding='utf-8') as f:
+            lines = f.read().splitlines(keepends=True)
+        for line in lines:
+            try:
+                snapshot = Snapshot.from_dict(json.loads(line))
+            except (ValueError, TypeError):
+                # a line cut short by a crash loses that snapshot, not the index
+                continue
+            self.snapshots[snapshot.id] = snapshot
+        if lines and not lines[-1].endswith('\n'):
+            # rewritten so the next snapshot doesn't join the broken line
+            self.write_index()
+
+    def blob_path(self, blob, compression):
+        return os.path.join(self.directory, 'objects', blob[:2], blob[2:] + EXTENSIONS[compression])
+
+    def find_blob(self, blob):
+        for compression in EXTENSIONS:
+            if os.path.exists(self.blob_path(blob, compression)):
+                return compression
+        return None
+
+    def write_blob(self, blob, body):
+        compression = self.find_blob(blob)
+        if compression is not None:
+            return compression, os.path.getsize(self.blob_path(blob, compression))
+        path = self.blob_path(blob, self.compression)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = compress(body, self.compression)
+        # written beside the blob then renamed, so a blob is never seen half written
+        handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(handle, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        return self.compression, len(data)
+
+    def add(self, url, body, headers=None, time=None):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        blob = hashlib.sha256(body).hexdigest()
+        snapshot_id = hashlib.sha256(f'{url}\n{blob}'.encode('utf-8')).hexdigest()[:16]
+        if snapshot_id in self.snapshots:
+            return self.snapshots[snapshot_id]
+
+        compression, stored_size = self.write_blob(blob, body)
+        snapshot = Snapshot(
+            id=snapshot_id,
+            url=url,
+            time=time or datetime.now().isoformat(timespec='seconds'),
+            blob=blob,
+            size=len(body),
+            stored_size=stored_size,
+            compression=compression,
+            headers=plain_headers(headers),
+        )
+        with open(self.index_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(snapshot.to_dict()) + '\n')
+        self.snapshots[snapshot_id] = snapshot
+        return snapshot
+
+    def get(self, snapshot_id):
+        return self.snapshots[snapshot_id]
+
+    def read(self, snapshot_id):
+        snapshot = self.snapshots[snapshot_id]
+        return read_blob(self.blob_path(snapshot.blob, snapshot.compression), snapshot.compression)
+
+    def get_text(self, snapshot_id):
+        # decoded the way the page was when it was fetched
+        snapshot = self.snapshots[snapshot_id]
+        _, text = html_to_unicode(get_header(snapshot.headers, 'Content-Type'), self.read(snapshot_id))
+        return text
+
+    def get_selector(self, snapshot_id):
+        return Selector(text=self.get_text(snapshot_id))
+
+    def remove(self, snapshot_id):
+        snapshot = self.snapshots.pop(snapshot_id)
+        self.write_index()
+        if not any(other.blob == snapshot.blob for other in self.snapshots.values()):
+            path = self.blob_path(snapshot.blob, snapshot.compression)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # already gone, the snapshot is still removed from the index
+                pass
+            try:
+                os.rmdir(os.path.dirname(path))
+            except OSError:
+                # other blobs share the folder
+                pass
+
+    def write_index(self):
+        handle, temp_path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(handle, 'w', encoding='utf-8') as f:
+            for snapshot in self.snapshots.values():
+                f.write(json.dumps(snapshot.to_dict()) + '\n')
+        os.replace(temp_path, self.index_path)
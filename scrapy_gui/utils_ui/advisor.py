@@ -0,0 +1,115 @@
+import math
+import re
+import timeit
+
+from .parser import css_to_xpath
+
+CLASS_PREFILTER = re.compile(r"@class and contains\(@class, '[^']*'\) and ")
+CLASS_TOKEN = re.compile(r" and contains\(concat\(' ', normalize-space\(@class\), ' '\), ' [^']*? '\)")
+SIBLING_COUNT = re.compile(r"count\(((?:preceding|following)-sibling::[^)]+)\) = 0")
+INNER_DESCENDANT = re.compile(r"(?<=[\w\]\)\*])//(?!@)")
+
+# each rewrite is meant to keep the results the same, but every candidate is
+# checked against the original query so a rewrite that changes them is reported
+REWRITES = [
+    ('Abbreviated descendants', lambda xpath: xpath.replace('/descendant::', '//')),
+    ('Explicit descendants', lambda xpath: INNER_DESCENDANT.sub('/descendant::', xpath)),
+    ('Absolute root', lambda xpath: re.sub(r'^descendant-or-self::', '//', xpath)),
+    ('Class token test only', lambda xpath: CLASS_PREFILTER.sub('', xpath)),
+    ('Class substring test only', lambda xpath: CLASS_TOKEN.sub('', xpath)),
+    ('Sibling test without count', lambda xpath: SIBLING_COUNT.sub(r'not(\1)', xpath)),
+]
+
+
+def parse_alternatives(text, default_type):
+    # one query per line, optionally starting with 'css:' or 'xpath:'
+    alternatives = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        query_type = default_type
+        prefix, _, rest = line.partition(':')
+        if prefix.strip().lower() in ('css', 'xpath') and rest.strip():
+            query_type = prefix.strip().lower()
+            line = rest.strip()
+        alternatives.append((f'Alternative {len(alternatives) + 1}', line, query_type))
+    return alternatives
+
+
+def suggest_alternatives(query, query_type, document_type='html'):
+    if query_type == 'css':
+        xpath = css_to_xpath(query, document_type)
+        suggestions = [('Generated XPath', xpath, 'xpath')]
+    else:
+        xpath = query
+        suggestions = []
+    for label, rewrite in REWRITES:
+        suggestions.append((label, rewrite(xpath), 'xpath'))
+    return suggestions
+
+
+def get_candidates(query, query_type, alternatives=(), suggest=True, document_type='html'):
+    candidates = [('Original', query, query_type)]
+    if suggest:
+        candidates.extend(suggest_alternatives(query, query_type, document_type))
+    candidates.extend(alternatives)
+
+    seen = set()
+    unique = []
+    for label, candidate, candidate_type in candidates:
+        key = (candidate, candidate_type)
+        if key not in seen:
+            seen.add(key)
+            unique.append((label, candidate, candidate_type))
+    return unique
+
+
+def time_query(selector, query, query_type, repeat=5):
+    run = selector.css if query_type == 'css' else selector.xpath
+
+    def statement():
+        return run(query).getall()
+
+    results = statement()
+    timer = timeit.Timer(statement)
+    # like the timeit command line, enough loops for each repeat to take 0.2s
+    number, _ = timer.autorange()
+    times = [total / number for total in timer.repeat(repeat, number)]
+    mean = sum(times) / len(times)
+    stdev = math.sqrt(sum((value - mean) ** 2 for value in times) / len(times))
+    return results, {'best': min(times), 'mean': mean, 'stdev': stdev, 'loops': number}
+
+
+def compare_queries(selector, candidates, repeat=5):
+    reports = []
+    expected = None
+    for label, query, query_type in candidates:
+        report = {
+            'label': label,
+            'query': query,
+            'type': query_type,
+            'count': None,
+            'same': None,
+            'error': None,
+        }
+        try:
+            results, stats = time_query(selector, query, query_type, repeat)
+        except Exception as e:
+            report['error'] = f'{type(e).__name__}: {e}'
+            reports.append(report)
+            continue
+        report.update(stats)
+        report['count'] = len(results)
+        if expected is None and label == 'Original':
+            expected = results
+        report['same'] = results == expected
+        reports.append(report)
+    return reports
+
+
+def fastest(reports):
+    valid = [report for report in reports if report['same'] and not report['error']]
+    if not valid:
+        return None
+    return min(valid, key=lambda report: report['best'])
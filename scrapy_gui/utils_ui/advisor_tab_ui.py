@@ -0,0 +1,165 @@
+from PyQt5.QtWidgets import *
+from PyQt5.QtCore import *
+
+from .runner import QueryRunner
+from .tools_tab_ui import BigHandleSplitter
+from .worker import get_text
+from .advisor import parse_alternatives, fastest
+from . import errors
+
+
+def milliseconds(seconds):
+    return round(seconds * 1000, 4)
+
+
+def number_item(value):
+    item = QTableWidgetItem()
+    if value is not None:
+        item.setData(Qt.DisplayRole, value)
+    return item
+
+
+class Advisor(BigHandleSplitter):
+    default_repeat = 5
+    default_timeout = 120
+
+    def __init__(self, *args, main):
+        super().__init__(*args)
+        self.main = main
+        self.runner = QueryRunner(self)
+        self.runner.finished.connect(self.benchmark_finished)
+        self.runner.failed.connect(self.benchmark_failed)
+        self.runner.progress.connect(self.benchmark_progress)
+        self.runner.stopped.connect(self.benchmark_stopped)
+        self.loaded = None
+        self.reports = []
+        self.initUI()
+
+    def initUI(self):
+        self.setOrientation(Qt.Vertical)
+        top = QFrame()
+        grid = QGridLayout()
+        top.setLayout(grid)
+
+        grid.addWidget(QLabel('Alternatives'), 0, 0)
+        self.suggest_check = QCheckBox('Suggest Alternatives')
+        self.suggest_check.setToolTip('Also time rewritten forms of the XPath the query runs as')
+        self.suggest_check.setChecked(True)
+        grid.addWidget(self.suggest_check, 0, 1)
+
+        self.alternatives = QPlainTextEdit()
+        self.alternatives.setLineWrapMode(QPlainTextEdit.NoWrap)
+        self.alternatives.setPlaceholderText(
+            "One query per line to compare with the Tools tab query\n"
+            "Start a line with 'css:' or 'xpath:' to set its type"
+        )
+        grid.addWidget(self.alternatives, 1, 0, 1, 4)
+
+        grid.addWidget(QLabel('Repeat'), 2, 0)
+        self.repeat = QSpinBox()
+        self.repeat.setRange(1, 100)
+        self.repeat.setValue(self.default_repeat)
+        grid.addWidget(self.repeat, 2, 1)
+
+        self.run_button = QPushButton('Benchmark Query')
+        self.run_button.clicked.connect(self.run_benchmark)
+        grid.addWidget(self.run_button, 2, 2)
+
+        self.cancel_button = QPushButton('Cancel')
+        self.cancel_button.setDisabled(True)
+        self.cancel_button.clicked.connect(self.runner.cancel)
+        grid.addWidget(self.cancel_button, 2, 3)
+
+        self.message = QLabel()
+        self.message.setWordWrap(True)
+        grid.addWidget(self.message, 3, 0, 1, 4)
+        self.addWidget(top)
+
+        self.results = QTableWidget(0, 9)
+        self.results.setHorizontalHeaderLabels([
+            'Form', 'Query', 'Type', 'Best (ms)', 'Mean (ms)', 'Std Dev (ms)', 'Loops', 'Results', 'Same Results',
+        ])
+        self.results.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)
+        self.results.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.results.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.results.setToolTip('Double click a query to use it in the Tools tab')
+        self.results.doubleClicked.connect(self.use_query)
+        self.addWidget(self.results)
+
+    def run_benchmark(self):
+        selector = self.main.queries.selector
+        query, query_type = self.main.queries.query_section.get_query()
+        if selector is None or not query.strip():
+            return
+        if selector is not self.loaded:
+            # the advisor has its own worker so timings aren't skewed by other queries
+            self.runner.load(get_text(selector))
+            self.loaded = selector
+
+        alternatives = parse_alternatives(self.alternatives.toPlainText(), query_type)
+        self.run_button.setDisabled(True)
+        self.cancel_button.setEnabled(True)
+        self.message.setText('Running')
+        self.runner.benchmark(
+            query,
+            query_type,
+            alternatives,
+            self.suggest_check.isChecked(),
+            self.repeat.value(),
+            self.default_timeout,
+        )
+
+    def benchmark_progress(self, elapsed):
+        self.message.setText(f'Running {elapsed:.1f}s')
+
+    def benchmark_finished(self, reports):
+        self.reset_buttons()
+        self.reports = reports
+        self.results.setSortingEnabled(False)
+        self.results.setRowCount(0)
+        for row, report in enumerate(reports):
+            self.results.insertRow(row)
+            self.results.setItem(row, 0, QTableWidgetItem(report['label']))
+            query_item = QTableWidgetItem(report['query'])
+            query_item.setToolTip(report['query'])
+            self.results.setItem(row, 1, query_item)
+            self.results.setItem(row, 2, QTableWidgetItem(report['type']))
+            if report['error']:
+                self.results.setItem(row, 8, QTableWidgetItem(report['error']))
+                continue
+            self.results.setItem(row, 3, number_item(milliseconds(report['best'])))
+            self.results.setItem(row, 4, number_item(milliseconds(report['mean'])))
+            self.results.setItem(row, 5, number_item(milliseconds(report['stdev'])))
+            self.results.setItem(row, 6, number_item(report['loops']))
+            self.results.setItem(row, 7, number_item(report['count']))
+            self.results.setItem(row, 8, QTableWidgetItem('Yes' if report['same'] else 'No'))
+        self.results.setSortingEnabled(True)
+        self.message.setText(self.summary(reports))
+
+    def summary(self, reports):
+        original = reports[0]
+        if original['error']:
+            return f"The query failed: {original['error']}"
+        best = fastest(reports)
+        if best is original:
+            return 'The original query is the fastest form with identical results'
+        speedup = original['best'] / best['best'] if best['best'] else float('inf')
+        return f"Fastest with identical results: {best['label']}, {speedup:.1f}x faster\n{best['query']}"
+
+    def benchmark_failed(self, title, message, error_type):
+        self.reset_buttons()
+        self.message.setText(title)
+        errors.show_error_dialog(self, title, message, error_type)
+
+    def benchmark_stopped(self):
+        self.reset_buttons()
+        self.message.setText('Cancelled')
+
+    def reset_buttons(self):
+        self.run_button.setEnabled(True)
+        self.cancel_button.setDisabled(True)
+
+    def use_query(self, index):
+        query = self.results.item(index.row(), 1).text()
+        query_type = self.results.item(index.row(), 2).text()
+        self.main.queries.query_section.set_query(query, query_type)
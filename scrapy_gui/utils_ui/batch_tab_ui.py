@@ -0,0 +1,287 @@
+from PyQt5.QtWidgets import *
+from PyQt5.QtCore import *
+
+import threading
+
+from ..batch import iter_batch, find_pages, load_query_set, save_query_set
+from ..export import BatchWriter, export_parse_code, get_format, open_export
+from .tools_tab_ui import BigHandleSplitter
+from . import errors
+
+
+class BatchThread(QThread):
+    page_done = pyqtSignal(dict)
+
+    def __init__(self, *args, pages, queries, workers, writer=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pages = pages
+        self.queries = queries
+        self.workers = workers
+        self.writer = writer
+        self.stop = threading.Event()
+
+    def run(self):
+        batch = iter_batch(self.pages, self.queries, self.workers, stop=self.stop)
+        try:
+            for record in batch:
+                if self.stop.is_set():
+                    batch.close()
+                    break
+                if self.writer is not None:
+                    # each page is written as it arrives, so the values never all have to be in memory
+                    self.writer.write(record)
+                self.page_done.emit(record)
+        finally:
+            if self.writer is not None:
+                self.writer.file.close()
+
+    def cancel(self):
+        # the pages waiting for a worker are cancelled straight away, only those running finish
+        self.stop.set()
+
+
+class BatchQueries(BigHandleSplitter):
+    preview_count = 5
+
+    def __init__(self, *args, main):
+        super().__init__(*args)
+        self.main = main
+        self.batch_thread = None
+        self.fields = []
+        self.initUI()
+
+    def initUI(self):
+        self.setOrientation(Qt.Vertical)
+        top = QFrame()
+        grid = QGridLayout()
+        top.setLayout(grid)
+
+        grid.addWidget(QLabel('Query Set'), 0, 0)
+        self.query_table = QTableWidget(0, 4)
+        self.query_table.setHorizontalHeaderLabels(['Name', 'Type', 'Query', 'Regex'])
+        self.query_table.horizontalHeader().setStretchLastSection(True)
+        grid.addWidget(self.query_table, 1, 0, 1, 4)
+
+        add_button = QPushButton('Add Current Query')
+        add_button.clicked.connect(self.add_current_query)
+        grid.addWidget(add_button, 2, 0)
+
+        remove_button = QPushButton('Remove')
+        remove_button.clicked.connect(self.remove_query)
+        grid.addWidget(remove_button, 2, 1)
+
+        load_button = QPushButton('Load Set')
+        load_button.clicked.connect(self.load_set)
+        grid.addWidget(load_button, 2, 2)
+
+        save_button = QPushButton('Save Set')
+        save_button.clicked.connect(self.save_set)
+        grid.addWidget(save_button, 2, 3)
+
+        grid.addWidget(QLabel('Pages'), 3, 0)
+        self.pages_entry = QLineEdit()
+        self.pages_entry.setPlaceholderText('Directory or glob pattern, e.g. pages/**/*.html')
+        grid.addWidget(self.pages_entry, 4, 0, 1, 3)
+
+        browse_button = QPushButton('Browse')
+        browse_button.clicked.connect(self.browse)
+        grid.addWidget(browse_button, 4, 3)
+
+        grid.addWidget(QLabel('Output File'), 5, 0)
+        self.output_entry = QLineEdit()
+        self.output_entry.setPlaceholderText('Optional, results are written as .csv or .jsonl while the batch runs')
+        grid.addWidget(self.output_entry, 6, 0, 1, 3)
+
+        output_button = QPushButton('Browse')
+        output_button.clicked.connect(self.browse_output)
+        grid.addWidget(output_button, 6, 3)
+
+        grid.addWidget(QLabel('Workers'), 7, 0)
+        self.workers = QSpinBox()
+        self.workers.setRange(0, 64)
+        self.workers.setSpecialValueText('Auto')
+        grid.addWidget(self.workers, 7, 1)
+
+        self.run_button = QPushButton('Run Batch')
+        self.run_button.clicked.connect(self.run_batch)
+        grid.addWidget(self.run_button, 7, 2)
+
+        self.cancel_button = QPushButton('Cancel')
+        self.cancel_button.setDisabled(True)
+        self.cancel_button.clicked.connect(self.cancel_batch)
+        grid.addWidget(self.cancel_button, 7, 3)
+
+        self.progress = QProgressBar()
+        grid.addWidget(self.progress, 8, 0, 1, 3)
+
+        spider_button = QPushButton('Export Spider')
+        spider_button.setToolTip('Save the query set as a spider parse method using an ItemLoader')
+        spider_button.clicked.connect(self.export_spider)
+        grid.addWidget(spider_button, 8, 3)
+        self.addWidget(top)
+
+        self.results = QTableWidget()
+        self.results.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.addWidget(self.results)
+
+    def add_current_query(self):
+        query, query_type, regex, function = self.main.queries.get_query_details()
+        if not query:
+            return
+        row = self.query_table.rowCount()
+        self.add_query_row(f'field_{row + 1}', query_type, query, regex, function)
+
+    def add_query_row(self, name, query_type, query, regex, function):
+        row = self.query_table.rowCount()
+        self.query_table.insertRow(row)
+        name_item = QTableWidgetItem(name)
+        # functions are too long to edit in a cell so they ride along with the name
+        name_item.setData(Qt.UserRole, function)
+        if function:
+            name_item.setToolTip(function)
+        self.query_table.setItem(row, 0, name_item)
+        self.query_table.setItem(row, 1, QTableWidgetItem(query_type))
+        self.query_table.setItem(row, 2, QTableWidgetItem(query))
+        self.query_table.setItem(row, 3, QTableWidgetItem(regex or ''))
+
+    def remove_query(self):
+        rows = sorted({index.row() for index in self.query_table.selectedIndexes()}, reverse=True)
+        for row in rows:
+            self.query_table.removeRow(row)
+
+    def get_query_set(self):
+        queries = {}
+        for row in range(self.query_table.rowCount()):
+            name_item = self.query_table.item(row, 0)
+            queries[name_item.text()] = {
+                'query': self.query_table.item(row, 2).text(),
+                'type': self.query_table.item(row, 1).text().lower(),
+                'regex': self.query_table.item(row, 3).text() or None,
+                'function': name_item.data(Qt.UserRole) or None,
+            }
+        return queries
+
+    def load_set(self):
+        path, _ = QFileDialog.getOpenFileName(self, 'Load Query Set', filter='JSON (*.json)')
+        if not path:
+            return
+        try:
+            queries = load_query_set(path)
+        except (OSError, ValueError, KeyError, AttributeError) as e:
+            errors.show_error_dialog(self, 'Query Set Error', f'Could not load query set\n\n{e}', 'critical')
+            return
+        self.query_table.setRowCount(0)
+        for name, spec in queries.items():
+            self.add_query_row(name, spec['type'], spec['query'], spec['regex'], spec['function'])
+
+    def save_set(self):
+        path, _ = QFileDialog.getSaveFileName(self, 'Save Query Set', filter='JSON (*.json)')
+        if path:
+            save_query_set(path, self.get_query_set())
+
+    def browse(self):
+        path = QFileDialog.getExistingDirectory(self, 'Pages Directory')
+        if path:
+            self.pages_entry.setText(path)
+
+    def browse_output(self):
+        path, _ = QFileDialog.getSaveFileName(
+            self,
+            'Output File',
+            filter='CSV (*.csv);;JSON Lines (*.jsonl)',
+        )
+        if path:
+            self.output_entry.setText(path)
+
+    def export_spider(self):
+        queries = self.get_query_set()
+        if not queries:
+            return
+        path, _ = QFileDialog.getSaveFileName(self, 'Export Spider', filter='Python (*.py)')
+        if not path:
+            return
+        try:
+            export_parse_code(path, queries)
+        except OSError as e:
+            errors.show_error_dialog(self, 'Export Error', f'Could not save spider\n\n{e}', 'critical')
+
+    def run_batch(self):
+        queries = self.get_query_set()
+        pages = find_pages([self.pages_entry.text()])
+        if not queries or not pages:
+            errors.show_error_dialog(
+                self,
+                'Batch Error',
+                'A batch needs at least one query and one page',
+                'info',
+            )
+            return
+
+        writer = None
+        output = self.output_entry.text().strip()
+        if output:
+            try:
+                writer = BatchWriter(open_export(output), get_format(output))
+            except OSError as e:
+                errors.show_error_dialog(self, 'Batch Error', f'Could not open output file\n\n{e}', 'critical')
+                return
+
+        self.fields = list(queries)
+        self.results.setSortingEnabled(False)
+        self.results.clear()
+        self.results.setRowCount(0)
+        self.results.setColumnCount(len(self.fields) + 2)
+        self.results.setHorizontalHeaderLabels(['Page', 'Time (ms)'] + self.fields)
+        self.progress.setRange(0, len(pages))
+        self.progress.setValue(0)
+
+        self.batch_thread = BatchThread(
+            pages=pages,
+            queries=queries,
+            workers=self.workers.value() or None,
+            writer=writer,
+        )
+        self.batch_thread.page_done.connect(self.add_page)
+        self.batch_thread.finished.connect(self.batch_finished)
+        self.run_button.setDisabled(True)
+        self.cancel_button.setEnabled(True)
+        self.batch_thread.start()
+
+    def add_page(self, record):
+        row = self.results.rowCount()
+        self.results.insertRow(row)
+        self.results.setItem(row, 0, QTableWidgetItem(record['page']))
+        if record['error']:
+            item = QTableWidgetItem('Error')
+            item.setToolTip(record['error'])
+            self.results.setItem(row, 1, item)
+        else:
+            time_item = QTableWidgetItem()
+            time_item.setData(Qt.DisplayRole, round(record['time'] * 1000, 2))
+            self.results.setItem(row, 1, time_item)
+
+        for column, name in enumerate(self.fields, 2):
+            field = record['fields'].get(name)
+            if field is None:
+                continue
+            item = QTableWidgetItem()
+            if field['error']:
+                item.setText(field['error'])
+                item.setForeground(Qt.red)
+            else:
+                item.setData(Qt.DisplayRole, field['count'])
+            preview = '\n'.join(str(result) for result in field['results'][:self.preview_count])
+            item.setToolTip(f"{field['time'] * 1000:.2f}ms\n{preview}")
+            self.results.setItem(row, column, item)
+        self.progress.setValue(self.progress.value() + 1)
+
+    def cancel_batch(self):
+        if self.batch_thread is not None:
+            self.batch_thread.cancel()
+            self.cancel_button.setDisabled(True)
+
+    def batch_finished(self):
+        self.run_button.setEnabled(True)
+        self.cancel_button.setDisabled(True)
+        self.results.setSortingEnabled(True)
+        self.batch_thread = None
@@ -0,0 +1,195 @@
+from PyQt5.QtWidgets import *
+from PyQt5.QtCore import *
+
+from .batch_tab_ui import BatchThread
+from .tools_tab_ui import BigHandleSplitter
+from .session import DocumentStore
+
+
+class Documents(BigHandleSplitter):
+    default_budget = 512
+
+    def __init__(self, *args, main):
+        super().__init__(*args)
+        self.main = main
+        self.store = DocumentStore(memory_budget=self.default_budget * 1024 * 1024)
+        self.batch_thread = None
+        self.urls = {}
+        self.initUI()
+
+    def initUI(self):
+        self.setOrientation(Qt.Vertical)
+        top = QFrame()
+        grid = QGridLayout()
+        top.setLayout(grid)
+
+        grid.addWidget(QLabel('Loaded Documents'), 0, 0)
+        self.memory_label = QLabel()
+        grid.addWidget(self.memory_label, 0, 1, 1, 2)
+
+        self.lean_check = QCheckBox('Lean Memory')
+        self.lean_check.setToolTip(
+            'Parse pages without keeping their text beside the tree, and keep only the shown page in the Source tab'
+        )
+        self.lean_check.toggled.connect(self.set_lean)
+        grid.addWidget(self.lean_check, 0, 3)
+
+        self.table = QTableWidget(0, 4)
+        self.table.setHorizontalHeaderLabels(['Document', 'Size (KB)', 'In Memory', 'Memory (KB)'])
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.doubleClicked.connect(self.open_document)
+        grid.addWidget(self.table, 1, 0, 1, 4)
+
+        open_button = QPushButton('Open')
+        open_button.clicked.connect(self.open_document)
+        grid.addWidget(open_button, 2, 0)
+
+        remove_button = QPushButton('Remove')
+        remove_button.clicked.connect(self.remove_document)
+        grid.addWidget(remove_button, 2, 1)
+
+        grid.addWidget(QLabel('Memory Budget'), 2, 2)
+        self.budget = QSpinBox()
+        self.budget.setRange(16, 1024 * 1024)
+        self.budget.setSingleStep(128)
+        self.budget.setSuffix(' MB')
+        self.budget.setValue(self.default_budget)
+        self.budget.valueChanged.connect(self.set_budget)
+        grid.addWidget(self.budget, 2, 3)
+
+        self.run_button = QPushButton('Run Current Query On All')
+        self.run_button.clicked.connect(self.run_all)
+        grid.addWidget(self.run_button, 3, 0, 1, 2)
+
+        self.cancel_button = QPushButton('Cancel')
+        self.cancel_button.setDisabled(True)
+        self.cancel_button.clicked.connect(self.cancel_run)
+        grid.addWidget(self.cancel_button, 3, 2)
+
+        self.progress = QProgressBar()
+        grid.addWidget(self.progress, 3, 3)
+        self.addWidget(top)
+
+        self.results = QTableWidget(0, 4)
+        self.results.setHorizontalHeaderLabels(['Document', 'Results', 'Time (ms)', 'First Result'])
+        self.results.horizontalHeader().setStretchLastSection(True)
+        self.results.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.addWidget(self.results)
+
+    def add_document(self, url, text, selector=None):
+        document = self.store.add(url, text, selector)
+        self.refresh()
+        return document.selector
+
+    def showEvent(self, event):
+        # the source tab formats pages in the background, so its share changes after loading
+        super().showEvent(event)
+        self.refresh()
+
+    def refresh(self):
+        self.table.setRowCount(0)
+        for row, document in enumerate(reversed(list(self.store))):
+            self.table.insertRow(row)
+            url_item = QTableWidgetItem(document.url)
+            url_item.setData(Qt.UserRole, document.key)
+            url_item.setToolTip(document.url)
+            self.table.setItem(row, 0, url_item)
+            size_item = QTableWidgetItem()
+            size_item.setData(Qt.DisplayRole, round(document.size / 1024, 1))
+            self.table.setItem(row, 1, size_item)
+            self.table.setItem(row, 2, QTableWidgetItem('Yes' if document.is_parsed() else 'No'))
+            parts = dict(document.memory_parts, viewer=self.main.source_viewer.source_memory(document.key))
+            memory_item = QTableWidgetItem()
+            memory_item.setData(Qt.DisplayRole, round(sum(parts.values()) / 1024, 1))
+            memory_item.setToolTip(', '.join(f'{name} {size / 1024:.1f} KB' for name, size in parts.items()))
+            self.table.setItem(row, 3, memory_item)
+        used = self.store.memory_used() / 1024 / 1024
+        self.memory_label.setText(f'{len(self.store)} documents, about {used:.1f} MB of trees in memory')
+
+    def selected_keys(self):
+        rows = {index.row() for index in self.table.selectedIndexes()}
+        return [self.table.item(row, 0).data(Qt.UserRole) for row in sorted(rows)]
+
+    def open_document(self):
+        keys = self.selected_keys()
+        if not keys:
+            return
+        key = keys[0]
+        selector = self.store.get_selector(key)
+        self.main.show_document(selector, self.store.get_text(key))
+        self.refresh()
+
+    def remove_document(self):
+        for key in self.selected_keys():
+            self.store.remove(key)
+        self.refresh()
+
+    def set_lean(self, enabled):
+        # applies to pages parsed from now on, documents already in memory are left as they are
+        self.store.lean = enabled
+        self.main.source_viewer.set_lean(enabled)
+        self.refresh()
+
+    def set_budget(self, megabytes):
+        self.store.memory_budget = megabytes * 1024 * 1024
+        self.store.evict()
+        self.refresh()
+
+    def run_all(self):
+        if not len(self.store):
+            return
+        query, query_type, regex, function = self.main.queries.get_query_details()
+        if not query:
+            return
+        queries = {
+            'query': {'query': query, 'type': query_type, 'regex': regex, 'function': function},
+        }
+        self.urls = {document.path: document.url for document in self.store}
+        self.results.setSortingEnabled(False)
+        self.results.setRowCount(0)
+        self.progress.setRange(0, len(self.urls))
+        self.progress.setValue(0)
+
+        # documents are re-parsed from their compressed copies in worker processes
+        self.batch_thread = BatchThread(pages=list(self.urls), queries=queries, workers=None)
+        self.batch_thread.page_done.connect(self.add_result)
+        self.batch_thread.finished.connect(self.run_finished)
+        self.run_button.setDisabled(True)
+        self.cancel_button.setEnabled(True)
+        self.batch_thread.start()
+
+    def add_result(self, record):
+        row = self.results.rowCount()
+        self.results.insertRow(row)
+        self.results.setItem(row, 0, QTableWidgetItem(self.urls.get(record['page'], record['page'])))
+        field = record['fields'].get('query')
+        if field is None:
+            self.results.setItem(row, 1, QTableWidgetItem(record['error'] or 'Error'))
+        elif field['error']:
+            self.results.setItem(row, 1, QTableWidgetItem(field['error']))
+        else:
+            count_item = QTableWidgetItem()
+            count_item.setData(Qt.DisplayRole, field['count'])
+            self.results.setItem(row, 1, count_item)
+            time_item = QTableWidgetItem()
+            time_item.setData(Qt.DisplayRole, round(field['time'] * 1000, 2))
+            self.results.setItem(row, 2, time_item)
+            if field['results']:
+                first = str(field['results'][0])
+                first_item = QTableWidgetItem(' '.join(first.split())[:200])
+                first_item.setToolTip(first[:2000])
+                self.results.setItem(row, 3, first_item)
+        self.progress.setValue(self.progress.value() + 1)
+
+    def cancel_run(self):
+        if self.batch_thread is not None:
+            self.batch_thread.cancel()
+            self.cancel_button.setDisabled(True)
+
+    def run_finished(self):
+        self.run_button.setEnabled(True)
+        self.cancel_button.setDisabled(True)
+        self.results.setSortingEnabled(True)
+        self.batch_thread = None
@@ -0,0 +1,208 @@
+from difflib import SequenceMatcher
+from collections import Counter
+from lxml import etree
+import time
+
+from .locate import local_name, element_children
+
+DEFAULT_LIMIT = 5000
+
+
+def normal_text(value):
+    return ' '.join((value or '').split())
+
+
+def own_text(element):
+    # the element's text without its children's, so a change is reported once
+    parts = [element.text] + [child.tail for child in element]
+    return normal_text(' '.join(part for part in parts if part))
+
+
+def signature(element):
+    # what makes two elements the same element even when their content differs,
+    # classes are left out as scripts often toggle them
+    return local_name(element), element.get('id') or ''
+
+
+def describe(element):
+    name, element_id = signature(element)
+    if element_id:
+        name += f'#{element_id}'
+    classes = (element.get('class') or '').split()
+    if classes:
+        name += '.' + '.'.join(classes)
+    return name
+
+
+def subtree_hashes(root):
+    # reversed document order reaches every child before its parent, so each
+    # subtree is hashed once and identical subtrees can be skipped whole
+    hashes = {}
+    sizes = {}
+    for element in reversed(list(root.iter(etree.Element))):
+        texts = [element.text]
+        child_hashes = []
+        size = 1
+        for child in element:
+            texts.append(child.tail)
+            if isinstance(child.tag, str):
+                child_hashes.append(hashes[child])
+                size += sizes[child]
+        attributes = element.attrib
+        hashes[element] = hash((
+            element.tag,
+            tuple(sorted(attributes.items())) if attributes else (),
+            ' '.join(' '.join(text for text in texts if text).split()),
+            tuple(child_hashes),
+        ))
+        sizes[element] = size
+    return hashes, sizes
+
+
+def opcodes(old, new):
+    # unchanged runs at either end are common and skipped before matching,
+    # which is slow on long lists with many repeated values
+    length = min(len(old), len(new))
+    prefix = 0
+    while prefix < length and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < length - prefix and old[-1 - suffix] == new[-1 - suffix]:
+        suffix += 1
+    old_end = len(old) - suffix
+    new_end = len(new) - suffix
+    matcher = SequenceMatcher(None, old[prefix:old_end], new[prefix:new_end], autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag != 'equal':
+            yield tag, i1 + prefix, i2 + prefix, j1 + prefix, j2 + prefix
+
+
+def child_paths(path, children):
+    counts = Counter(local_name(child) for child in children)
+    seen = Counter()
+    paths = []
+    for child in children:
+        name = local_name(child)
+        seen[name] += 1
+        step = f'{name}[{seen[name]}]' if counts[name] > 1 else name
+        paths.append(f'{path}/{step}')
+    return paths
+
+
+def subtree_change(change, element, path, sizes):
+    size = sizes[element]
+    detail = f'{size} element' + ('s' if size != 1 else '')
+    text = normal_text(element.xpath('string()'))
+    if text:
+        detail += f': {text[:100]}'
+    return {'change': change, 'path': path, 'element': describe(element), 'detail': detail}
+
+
+def node_changes(old, new, path):
+    changes = []
+    old_attributes = dict(old.attrib)
+    new_attributes = dict(new.attrib)
+    if old_attributes != new_attributes:
+        details = []
+        for name in sorted(set(old_attributes) | set(new_attributes)):
+            before = old_attributes.get(name)
+            after = new_attributes.get(name)
+            if before == after:
+                continue
+            if before is None:
+                details.append(f'+{name}="{after[:60]}"')
+            elif after is None:
+                details.append(f'-{name}')
+            else:
+                details.append(f'{name}: "{before[:60]}" -> "{after[:60]}"')
+        changes.append({'change': 'attributes', 'path': path, 'element': describe(new), 'detail': ', '.join(details)})
+    old_text = own_text(old)
+    new_text = own_text(new)
+    if old_text != new_text:
+        changes.append({
+            'change': 'text',
+            'path': path,
+            'element': describe(new),
+            'detail': f'"{old_text[:100]}" -> "{new_text[:100]}"',
+        })
+    return changes
+
+
+def diff_trees(old_root, new_root, limit=DEFAULT_LIMIT):
+    # top down: identical subtrees are matched by hash and skipped, children of
+    # changed elements are aligned by hash then by tag and id, and
+    # anything left over was added or removed as a whole
+    start = time.perf_counter()
+    old_hashes, old_sizes = subtree_hashes(old_root)
+    new_hashes, new_sizes = subtree_hashes(new_root)
+    changes = []
+
+    if signature(old_root) != signature(new_root):
+        changes.append(subtree_change('removed', old_root, '/' + local_name(old_root), old_sizes))
+        changes.append(subtree_change('added', new_root, '/' + local_name(new_root), new_sizes))
+        stack = []
+    else:
+        stack = [(old_root, new_root, '/' + local_name(new_root))]
+
+    while stack and len(changes) < limit:
+        old, new, path = stack.pop()
+        if old_hashes[old] == new_hashes[new]:
+            continue
+        changes.extend(node_changes(old, new, path))
+
+        old_children = element_children(old)
+        new_children = element_children(new)
+        old_paths = child_paths(path, old_children)
+        new_paths = child_paths(path, new_children)
+        pairs = []
+        changed = opcodes(
+            [old_hashes[child] for child in old_children],
+            [new_hashes[child] for child in new_children],
+        )
+        for _, i1, i2, j1, j2 in changed:
+            old_signatures = [signature(child) for child in old_children[i1:i2]]
+            new_signatures = [signature(child) for child in new_children[j1:j2]]
+            aligned = SequenceMatcher(None, old_signatures, new_signatures, autojunk=False).get_opcodes()
+            for align_tag, a1, a2, b1, b2 in aligned:
+                if align_tag == 'equal':
+                    for offset in range(a2 - a1):
+                        pairs.append((old_children[i1 + a1 + offset], new_children[j1 + b1 + offset],
+                                      new_paths[j1 + b1 + offset]))
+                    continue
+                for index in range(i1 + a1, i1 + a2):
+                    changes.append(subtree_change('removed', old_children[index], old_paths[index], old_sizes))
+                for index in range(j1 + b1, j1 + b2):
+                    changes.append(subtree_change('added', new_children[index], new_paths[index], new_sizes))
+        # reversed so they come off the stack in document order
+        stack.extend(reversed(pairs))
+
+    return {
+        'changes': changes[:limit],
+        'truncated': len(changes) >= limit,
+        'raw_elements': old_sizes[old_root],
+        'rendered_elements': new_sizes[new_root],
+        'time': time.perf_counter() - start,
+    }
+
+
+def diff_results(raw, rendered, limit=DEFAULT_LIMIT):
+    # results in one document and not the other, in order, with a count of the
+    # shared ones. values are compared as counts rather than aligned, which
+    # stays linear when a query returns thousands of repeated values
+    raw_counts = Counter(raw)
+    rendered_counts = Counter(rendered)
+    rows = []
+    for change, values, counts in (('raw only', raw, raw_counts - rendered_counts),
+                                   ('rendered only', rendered, rendered_counts - raw_counts)):
+        for value in values:
+            if counts[value] > 0:
+                counts[value] -= 1
+                rows.append((change, value))
+    return {
+        'rows': rows[:limit],
+        'truncated': len(rows) > limit,
+        'same': sum((raw_counts & rendered_counts).values()),
+        'reordered': not rows and raw != rendered,
+        'raw_count': len(raw),
+        'rendered_count': len(rendered),
+    }
@@ -1,11 +1,3 @@
-from PyQt5.QtWidgets import QMessageBox
-
-ERROR_TYPES = {
-    'info': QMessageBox.information,
-    'critical': QMessageBox.critical,
-}
-
-
 class QueryError(Exception):
     def __init__(self, *args, title, message, error_type):
         super().__init__(*args)
@@ -15,5 +7,12 @@ class QueryError(Exception):
 
 
 def show_error_dialog(parent, title, message, error_type):
-    message_box = ERROR_TYPES[error_type]
+    # imported here so the parser can be used without Qt
+    from PyQt5.QtWidgets import QMessageBox
+
+    error_types = {
+        'info': QMessageBox.information,
+        'critical': QMessageBox.critical,
+    }
+    message_box = error_types[error_type]
     message_box(parent, title, message)
@@ -0,0 +1,230 @@
+from cssselect.parser import SelectorSyntaxError
+from cssselect.xpath import ExpressionError
+from lxml import etree
+import re
+
+from .parser import css_to_xpath, DEFAULT_NAMESPACES
+from . import errors
+
+CSS_IDENTIFIER = re.compile(r'^-?[_a-zA-Z][_a-zA-Z0-9-]*$')
+
+
+def local_name(element):
+    return etree.QName(element).localname
+
+
+def element_children(element):
+    # comments and processing instructions aren't selectable, so they're left out
+    return [child for child in element if isinstance(child.tag, str)]
+
+
+def xpath_literal(value):
+    if '"' not in value:
+        return f'"{value}"'
+    if "'" not in value:
+        return f"'{value}'"
+    parts = value.split('"')
+    return 'concat(' + ', \'"\', '.join(f'"{part}"' for part in parts) + ')'
+
+
+def unique_id(element):
+    element_id = element.get('id')
+    if not element_id:
+        return None
+    matches = element.getroottree().xpath('//*[@id=$value]', value=element_id)
+    return element_id if len(matches) == 1 else None
+
+
+def same_tag_position(element):
+    parent = element.getparent()
+    if parent is None:
+        return None
+    siblings = [child for child in parent if child.tag == element.tag]
+    if len(siblings) == 1:
+        return None
+    return siblings.index(element) + 1
+
+
+def xpath_for(element):
+    # absolute path, anchored on the nearest element with an id unique in the page
+    steps = []
+    while element is not None:
+        element_id = unique_id(element)
+        if element_id is not None:
+            steps.append(f'//*[@id={xpath_literal(element_id)}]')
+            break
+        name = local_name(element)
+        step = name if name == element.tag else f'*[local-name()={xpath_literal(name)}]'
+        position = same_tag_position(element)
+        if position is not None:
+            step += f'[{position}]'
+        steps.append('/' + step)
+        element = element.getparent()
+    return ''.join(reversed(steps))
+
+
+def css_for(element):
+    parts = []
+    while element is not None:
+        element_id = unique_id(element)
+        if element_id is not None:
+            if CSS_IDENTIFIER.match(element_id):
+                parts.append(f'#{element_id}')
+            else:
+                parts.append(f'[id="{element_id}"]')
+            break
+        step = local_name(element)
+        position = same_tag_position(element)
+        if position is not None:
+            step += f':nth-of-type({position})'
+        parts.append(step)
+        element = element.getparent()
+    return ' > '.join(reversed(parts))
+
+
+def find_matches(root, query, query_type, document_type='html', namespaces=None):
+    # elements a query selects, text and attribute results count as their element
+    xpath = css_to_xpath(query, document_type) if query_type == 'css' else query
+    all_namespaces = dict(DEFAULT_NAMESPACES)
+    all_namespaces.update(namespaces or {})
+    results = etree.XPath(xpath, namespaces=all_namespaces, smart_strings=True)(root)
+    if not isinstance(results, list):
+        return []
+    matches = []
+    seen = set()
+    for result in results:
+        if isinstance(result, etree._Element):
+            element = result
+        else:
+            element = getattr(result, 'getparent', lambda: None)()
+            if element is not None and getattr(result, 'is_tail', False):
+                element = element.getparent()
+        if element is not None and isinstance(element.tag, str) and element not in seen:
+            seen.add(element)
+            matches.append(element)
+    return matches
+
+
+def locate_query(selector, query, query_type):
+    # the tree tab and the worker both parse the same text with make_selector, so
+    # an element's place in document order identifies it in either tree
+    try:
+        matches = set(find_matches(
+            selector.root,
+            query,
+            query_type,
+            getattr(selector, 'type', 'html'),
+            selector.namespaces,
+        ))
+    except (ExpressionError, SelectorSyntaxError, etree.XPathError, ValueError) as e:
+        raise errors.QueryError(
+            title=f'{query_type.title()} Error',
+            message=f'Error parsing {query_type} query\n\n{e}',
+            error_type='critical',
+        )
+    return [position for position, element in enumerate(selector.root.iter()) if element in matches]
+
+
+def elements_at(root, positions):
+    wanted = set(positions)
+    return [element for position, element in enumerate(root.iter()) if position in wanted]
+
+
+def resolve_path(root, steps):
+    # follows a browser element path through the parsed tree, by tag and
+    # position among siblings with the same tag
+    if not steps or local_name(root) != steps[0]['tag']:
+        return None
+    element = root
+    for step in steps[1:]:
+        siblings = [child for child in element_children(element) if local_name(child) == step['tag']]
+        if len(siblings) < step['index']:
+            return None
+        element = siblings[step['index'] - 1]
+    return element
+
+
+def css_step(step):
+    css = step['tag']
+    if step['count'] > 1:
+        css += f":nth-of-type({step['index']})"
+    return css
+
+
+def xpath_step(step):
+    xpath = step['tag']
+    if step['count'] > 1:
+        xpath += f"[{step['index']}]"
+    return xpath
+
+
+def id_css(element_id):
+    return f'#{element_id}' if CSS_IDENTIFIER.match(element_id) else f'[id="{element_id}"]'
+
+
+def path_candidates(steps):
+    target = steps[-1]
+    tag = target['tag']
+    classes = [name for name in target['classes'].split() if CSS_IDENTIFIER.match(name)]
+    candidates = []
+
+    if target['id']:
+        candidates.append(('Id', id_css(target['id']), 'css'))
+        candidates.append(('Id', f"//*[@id={xpath_literal(target['id'])}]", 'xpath'))
+    if classes:
+        candidates.append(('Classes', tag + ''.join(f'.{name}' for name in classes), 'css'))
+        candidates.append(('Class', f'//{tag}[contains(@class, {xpath_literal(classes[0])})]', 'xpath'))
+    if len(steps) > 1:
+        parent = steps[-2]
+        parent_classes = [name for name in parent['classes'].split() if CSS_IDENTIFIER.match(name)]
+        if parent_classes:
+            candidates.append(('Parent class', f"{parent['tag']}.{parent_classes[0]} > {tag}", 'css'))
+
+    # structural path from the closest ancestor with an id
+    css_steps = [css_step(target)]
+    xpath_steps = [xpath_step(target)]
+    for step in reversed(steps[:-1]):
+        if step['id']:
+            anchor_xpath = f"//*[@id={xpath_literal(step['id'])}]"
+            candidates.append(('Path from id', ' > '.join([id_css(step['id'])] + css_steps[::-1]), 'css'))
+            candidates.append(('Path from id', '/'.join([anchor_xpath] + xpath_steps[::-1]), 'xpath'))
+            break
+        css_steps.append(css_step(step))
+        xpath_steps.append(xpath_step(step))
+    candidates.append(('Absolute path', '/' + '/'.join(xpath_step(step) for step in steps), 'xpath'))
+    return candidates
+
+
+def evaluate_candidates(selector, steps):
+    # the browser shows the page after javascript has run, spiders only get the raw html
+    target = resolve_path(selector.root, steps)
+    differences = []
+    if target is None:
+        differences.append(
+            'Element is not at this path in the raw html, javascript or the browser '
+            'changed the page, for example by adding a tbody to a table'
+        )
+    else:
+        step = steps[-1]
+        if (target.get('id') or '') != step['id']:
+            differences.append('Element id differs in the raw html')
+        if (target.get('class') or '').split() != step['classes'].split():
+            differences.append('Element classes differ in the raw html')
+
+    reports = []
+    for label, query, query_type in path_candidates(steps):
+        report = {'label': label, 'query': query, 'type': query_type, 'count': None, 'selects': False, 'error': None}
+        try:
+            results = selector.css(query) if query_type == 'css' else selector.xpath(query)
+        except Exception as e:
+            report['error'] = f'{type(e).__name__}: {e}'
+            reports.append(report)
+            continue
+        report['count'] = len(results)
+        report['selects'] = target is not None and any(result.root is target for result in results)
+        reports.append(report)
+
+    # selectors that find the element, and only it, come first, otherwise
+    # they keep their order from the most to the least robust
+    reports.sort(key=lambda report: (not report['selects'], report['count'] != 1))
+    return {'found': target is not None, 'differences': differences, 'candidates': reports}
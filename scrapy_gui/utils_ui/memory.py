@@ -0,0 +1,66 @@
+from lxml import etree
+from lxml.html import HTMLParser
+from parsel import Selector
+import re
+import sys
+
+from .prettify import get_selector
+
+# matches parsel's check for xml documents
+XML_DECLARATION = re.compile(r'[\s\ufeff]*<\?xml\s')
+CHUNK_SIZE = 1024 * 1024
+# rough cost of each element in an lxml tree, its text is counted separately
+ELEMENT_SIZE = 300
+
+
+def is_plain_html(text):
+    # xml and json pages are left to parsel, which knows how to detect them
+    start = text[:256].lstrip()
+    return not XML_DECLARATION.match(text[:256]) and not start.startswith(('{', '['))
+
+
+def stream_parse(text, chunk_size=CHUNK_SIZE):
+    # fed to lxml a chunk at a time, so the page is never copied whole on the way in.
+    # huge_tree lets very large or deeply nested pages through instead of cutting them short
+    parser = HTMLParser(recover=True, encoding='utf-8', huge_tree=True)
+    fed = False
+    for start in range(0, len(text), chunk_size):
+        chunk = text[start:start + chunk_size].replace('\x00', '')
+        if not fed:
+            chunk = chunk.lstrip()
+        if chunk:
+            parser.feed(chunk.encode('utf-8'))
+            fed = True
+    if not fed:
+        parser.feed(b'<html/>')
+    try:
+        return parser.close()
+    except etree.XMLSyntaxError:
+        return etree.fromstring(b'<html/>', parser=HTMLParser(recover=True))
+
+
+def make_selector(text, lean=False):
+    # parsel keeps the text it was given beside the tree, a lean selector only has the tree
+    if not lean or not is_plain_html(text):
+        return Selector(text=text)
+    return Selector(root=stream_parse(text), type='html')
+
+
+def held_text(selector):
+    # scrapy responses and parsel selectors both keep the page's text alive
+    text = getattr(selector, 'text', None)
+    if text is None:
+        text = getattr(selector, '_text', None)
+    return text if isinstance(text, str) else None
+
+
+def measure_memory(selector, size):
+    # bytes held for one document. the tree is estimated from its element count
+    # and source size as lxml's allocations can't be traced from python
+    root = getattr(get_selector(selector), 'root', None)
+    elements = sum(1 for _ in root.iter()) if isinstance(root, etree._Element) else 0
+    text = held_text(selector)
+    return {
+        'tree': elements * ELEMENT_SIZE + size,
+        'text': sys.getsizeof(text) if text is not None else 0,
+    }
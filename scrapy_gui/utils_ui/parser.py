@@ -1,19 +1,201 @@
 from cssselect.xpath import ExpressionError
 from cssselect.parser import SelectorSyntaxError
+from parsel.csstranslator import HTMLTranslator, GenericTranslator
+from lxml import etree
+from collections import OrderedDict
+import hashlib
 import traceback
 from . import errors
+from .profiler import NULL_PROFILE
+from .regex_engine import DEFAULT_TIMEOUT, RegexTimeout, compile_pattern, get_engines, match_all
+
+
+class LRUCache:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        try:
+            value = self.data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self.data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.data[key] = value
+        self.data.move_to_end(key)
+        while len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+
+    def clear(self):
+        self.data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def info(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self.data),
+            'maxsize': self.maxsize,
+        }
+
+
+CACHES = {
+    'css': LRUCache(256),
+    'xpath': LRUCache(256),
+    'regex': LRUCache(256),
+    'function': LRUCache(32),
+    'selector_results': LRUCache(16),
+    'extract_results': LRUCache(32),
+    'function_results': LRUCache(32),
+    'pipeline': LRUCache(64),
+}
+# these hold results from a document, which keep its whole tree alive
+DOCUMENT_CACHES = ['selector_results', 'extract_results', 'function_results', 'pipeline']
+TRANSLATORS = {
+    'html': HTMLTranslator(),
+    'xml': GenericTranslator(),
+}
+# matches parsel's defaults so compiled queries behave like selector.xpath
+DEFAULT_NAMESPACES = {
+    're': 'http://exslt.org/regular-expressions',
+    'set': 'http://exslt.org/sets',
+}
+MISSING = object()
+
+
+def cache_info():
+    return {name: cache.info() for name, cache in CACHES.items()}
+
+
+def clear_caches():
+    for cache in CACHES.values():
+        cache.clear()
+
+
+def clear_document_caches():
+    for name in DOCUMENT_CACHES:
+        CACHES[name].clear()
+
+
+def fingerprint(text):
+    return hashlib.sha1(text.encode('utf-8', 'surrogatepass')).hexdigest()
+
+
+def css_to_xpath(query, document_type='html'):
+    key = (query, document_type)
+    xpath = CACHES['css'].get(key)
+    if xpath is None:
+        translator = TRANSLATORS.get(document_type, TRANSLATORS['html'])
+        xpath = translator.css_to_xpath(query)
+        CACHES['css'].put(key, xpath)
+    return xpath
+
+
+def compile_xpath(query, namespaces):
+    key = (query, tuple(sorted(namespaces.items())))
+    compiled = CACHES['xpath'].get(key)
+    if compiled is None:
+        compiled = etree.XPath(query, namespaces=namespaces, smart_strings=False)
+        CACHES['xpath'].put(key, compiled)
+    return compiled
+
+
+def compile_regex(regex):
+    engines = tuple(get_engines())
+    compiled = CACHES['regex'].get((regex, engines))
+    if compiled is None:
+        compiled = compile_pattern(regex, engines)
+        CACHES['regex'].put((regex, engines), compiled)
+    return compiled
+
+
+def compile_function(function):
+    # each edit of the function is compiled once into its own namespace
+    key = fingerprint(function)
+    namespace = CACHES['function'].get(key)
+    if namespace is None:
+        code = compile(function, '<user_fun>', 'exec')
+        namespace = {'__name__': '__user_fun__', '__builtins__': __builtins__}
+        exec(code, namespace)
+        CACHES['function'].put(key, namespace)
+    return namespace['user_fun']
 
 
 class Parser:
-    def __init__(self, selector):
+    def __init__(self, selector, document_id=None):
         self.selector = selector
+        self.document_id = document_id
+        self.profile = NULL_PROFILE
+        self.regex_timeout = DEFAULT_TIMEOUT
 
-    def do_query(self, query, query_type, selector, regex=None, function=None):
+    def get_document_id(self):
+        if self.document_id is None:
+            self.document_id = fingerprint(self.selector.get())
+        return self.document_id
+
+    def run_selector(self, query, query_type):
+        # registered namespaces change what a query matches, so they're part of the key
+        namespaces = tuple(sorted(self.selector.namespaces.items()))
+        key = (self.get_document_id(), query_type, query, namespaces)
+        results = CACHES['selector_results'].get(key, MISSING)
+        if results is not MISSING:
+            with self.profile.stage('evaluate') as stage:
+                stage.cached = True
+                stage.count = len(results)
+            return results
+
+        document_type = getattr(self.selector, 'type', 'html')
+        if query_type == 'css':
+            with self.profile.stage('translate'):
+                xpath = css_to_xpath(query, document_type)
+        else:
+            xpath = query
+        with self.profile.stage('evaluate') as stage:
+            results = self.evaluate_xpath(xpath)
+            stage.count = len(results)
+        CACHES['selector_results'].put(key, results)
+        return results
+
+    def evaluate_xpath(self, xpath, selector=None):
+        # relative to the document unless another selector in it is given
+        if selector is None:
+            selector = self.selector
+        root = getattr(selector, 'root', None)
+        if not isinstance(root, etree._Element):
+            return selector.xpath(xpath)
+
+        namespaces = dict(DEFAULT_NAMESPACES)
+        namespaces.update(selector.namespaces)
         try:
-            if query_type == 'css':
-                results = self.selector.css(query)
-            elif query_type == 'xpath':
-                results = self.selector.xpath(query)
+            result = compile_xpath(xpath, namespaces)(root)
+        except etree.XPathError as e:
+            raise ValueError(f'XPath error: {e} in {xpath}')
+        if not isinstance(result, list):
+            result = [result]
+
+        selector_class = type(selector)
+        document_type = 'xml' if selector.type == 'xml' else 'html'
+        return selector.selectorlist_cls(
+            selector_class(
+                root=node,
+                _expr=xpath,
+                namespaces=selector.namespaces,
+                type=document_type,
+            )
+            for node in result
+        )
+
+    def select(self, query, query_type):
+        try:
+            return self.run_selector(query, query_type)
         except (ExpressionError, SelectorSyntaxError, ValueError) as e:
             message = f'Error parsing {query_type} query\n\n{e}'
             raise errors.QueryError(
@@ -21,41 +203,91 @@ class Parser:
                 message=message,
                 error_type='critical',
             )
+
+    def preview(self, query, query_type, limit):
+        # only the first few results are serialised, the rest are just counted
+        results = self.select(query, query_type)
+        return len(results), [result.get() for result in results[:limit]]
+
+    def do_query(self, query, query_type, selector, regex=None, function=None):
+        results = self.select(query, query_type)
         if not results:
             raise errors.QueryError(
                 title='CSS Empty',
                 message=f'No results for {query_type} Query\n{query}',
                 error_type='info',
             )
-        if regex:
-            try:
-                results = results.re(regex)
-            except Exception as e:
-                message = f'Error running regex\n\n{e}'
-                raise errors.QueryError(
-                    title='RegEx Error',
-                    message=message,
-                    error_type='critical',
-                )
-            if not results:
-                raise errors.QueryError(
-                    title='RegEX Empty',
-                    message=f'No results for Regular Expression\n{regex}',
-                    error_type='info',
-                )
+        # the engine chosen can change what a pattern extracts
+        key = (self.get_document_id(), query_type, query, regex, tuple(get_engines()))
+        cached = CACHES['extract_results'].get(key)
+        with self.profile.stage('regex' if regex else 'extract') as stage:
+            if cached is not None:
+                results = cached
+                stage.cached = True
+            elif regex:
+                pattern = self.compile_regex(regex)
+                stage.name = f'regex ({pattern.engine})'
+                results = self.run_regex(pattern, (result.get() for result in results))
+                CACHES['extract_results'].put(key, results)
+            else:
+                results = results.getall()
+                CACHES['extract_results'].put(key, results)
+            stage.count = len(results)
 
-        else:
-            results = results.getall()
+        if regex and not results:
+            raise errors.QueryError(
+                title='RegEX Empty',
+                message=f'No results for Regular Expression\n{regex}',
+                error_type='info',
+            )
 
         if function:
-            results = self.use_custom_function(results, function, selector)
+            function_key = key + (fingerprint(function),)
+            cached = CACHES['function_results'].get(function_key)
+            with self.profile.stage('function') as stage:
+                if cached is not None:
+                    results = cached
+                    stage.cached = True
+                else:
+                    # copy so the function can't alter cached results from earlier stages
+                    results = self.use_custom_function(list(results), function, selector)
+                    if results:
+                        CACHES['function_results'].put(function_key, results)
+                stage.count = len(results) if results else 0
             if not results:
                 raise errors.QueryError(
                     title='Function Empty',
                     message=f'No results when using function\n\n{function}',
                     error_type='critical',
                 )
-        return results
+        return list(results)
+
+    def compile_regex(self, regex):
+        try:
+            return compile_regex(regex)
+        except Exception as e:
+            raise errors.QueryError(
+                title='RegEx Error',
+                message=f'Error compiling regex\n\n{e}',
+                error_type='critical',
+            )
+
+    def run_regex(self, pattern, texts):
+        try:
+            return match_all(pattern, texts, self.regex_timeout)
+        except RegexTimeout:
+            raise errors.QueryError(
+                title='RegEx Timeout',
+                message=f'Regular expression stopped after {self.regex_timeout:g} seconds, '
+                        f'it may be backtracking too much\n\n{pattern.pattern}',
+                error_type='critical',
+            )
+        except Exception as e:
+            raise errors.QueryError(
+                title='RegEx Error',
+                message=f'Error running regex\n\n{e}',
+                error_type='critical',
+            )
 
     def use_custom_function(self, results, function, selector):
         if 'def user_fun(results, selector):' not in function:
@@ -67,8 +299,14 @@ class Parser:
             )
 
         try:
-            exec(function, globals())
-            results = user_fun(results, selector)
+            user_fun = compile_function(function)
+            results = self.profile.call_function(user_fun, results, selector)
+            # converted here so a function returning something that isn't a list is its error too,
+            # selector lists are lists already and are kept so later stages can query them
+            if results is None:
+                results = []
+            elif not isinstance(results, list):
+                results = list(results)
         except Exception as e:
             message = f'Error running custom function\n\n{type(e).__name__}: {e.args}'
             message += f'\n\n{traceback.format_exc()}'
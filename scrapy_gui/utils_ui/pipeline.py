@@ -0,0 +1,143 @@
+from cssselect.xpath import ExpressionError
+from cssselect.parser import SelectorSyntaxError
+
+from ..engine import plain
+from .parser import CACHES, MISSING, css_to_xpath, fingerprint
+from . import errors
+
+STAGE_TYPES = ['css', 'xpath', 're', 'function']
+
+
+def is_selectors(value):
+    return hasattr(value, 'getall')
+
+
+def stage_key(stage):
+    # functions are keyed by a hash so long code doesn't bloat the cache keys
+    stage_type, query = stage
+    if stage_type == 'function':
+        return stage_type, fingerprint(query)
+    return stage_type, query
+
+
+def stage_label(label, stage):
+    stage_type, query = stage
+    if stage_type == 'function':
+        return f'{label}: function'
+    return f'{label}: {stage_type} {query}'
+
+
+def parse_stages(stages):
+    parsed = []
+    for stage in stages:
+        stage_type, query = stage
+        if stage_type not in STAGE_TYPES:
+            raise errors.QueryError(
+                title='Pipeline Error',
+                message=f'Unknown stage type {stage_type}, use one of {", ".join(STAGE_TYPES)}',
+                error_type='critical',
+            )
+        if query.strip():
+            parsed.append((stage_type, query))
+    return parsed
+
+
+class Pipeline:
+    # rows are selected first, then each field runs its own chain of stages
+    # on every row. every stage's output is cached under the stages leading
+    # up to it, so editing a stage only runs it and the ones after it
+    def __init__(self, parser, rows, fields):
+        self.parser = parser
+        self.rows = parse_stages(rows)
+        self.fields = [(name, parse_stages(stages)) for name, stages in fields]
+        self.document_type = getattr(parser.selector, 'type', 'html')
+
+    def run(self):
+        document_id = self.parser.get_document_id()
+        rows_key = (document_id, tuple(stage_key(stage) for stage in self.rows))
+        document = self.parser.selector.selectorlist_cls([self.parser.selector])
+        rows = self.run_chain('rows', (document_id,), self.rows, [document], [self.parser.selector])[0]
+        if not is_selectors(rows):
+            raise errors.QueryError(
+                title='Pipeline Error',
+                message='The row stages have to end with elements, not text',
+                error_type='critical',
+            )
+
+        columns = []
+        for name, stages in self.fields:
+            starts = [rows.__class__([row]) for row in rows]
+            # fields starting with the same stages share their cached output
+            values = self.run_chain(name, rows_key, stages, starts, list(rows))
+            columns.append([extract(value) for value in values])
+        if not self.fields:
+            columns.append([extract(rows.__class__([row])) for row in rows])
+
+        names = [name for name, _ in self.fields] or ['rows']
+        return {'columns': names, 'items': [list(item) for item in zip(*columns)]}
+
+    def run_chain(self, label, key, stages, values, selectors):
+        # the longest run of stages already cached is reused, only later ones run
+        start = 0
+        for end in range(len(stages), 0, -1):
+            cached = CACHES['pipeline'].get(key + tuple(stage_key(stage) for stage in stages[:end]), MISSING)
+            if cached is not MISSING:
+                values = cached
+                start = end
+                with self.parser.profile.stage(stage_label(label, stages[end - 1])) as stage:
+                    stage.cached = True
+                    stage.count = count(values)
+                break
+
+        for index in range(start, len(stages)):
+            stage_type, query = stages[index]
+            with self.parser.profile.stage(stage_label(label, stages[index])) as stage:
+                values = [self.apply(stage_type, query, value, selector) for value, selector in zip(values, selectors)]
+                stage.count = count(values)
+            CACHES['pipeline'].put(key + tuple(stage_key(stage) for stage in stages[:index + 1]), values)
+        return values
+
+    def apply(self, stage_type, query, value, selector):
+        if stage_type in ('css', 'xpath'):
+            if not is_selectors(value):
+                raise errors.QueryError(
+                    title='Pipeline Error',
+                    message=f'A {stage_type} stage needs elements, but the stage before it returned text\n\n{query}',
+                    error_type='critical',
+                )
+            try:
+                xpath = css_to_xpath(query, self.document_type) if stage_type == 'css' else query
+                results = []
+                for item in value:
+                    results.extend(self.parser.evaluate_xpath(xpath, item))
+            except (ExpressionError, SelectorSyntaxError, ValueError) as e:
+                raise errors.QueryError(
+                    title=f'{stage_type.title()} Error',
+                    message=f'Error parsing {stage_type} query\n\n{e}',
+                    error_type='critical',
+                )
+            return value.__class__(results)
+
+        if stage_type == 're':
+            pattern = self.parser.compile_regex(query)
+            if is_selectors(value):
+                return self.parser.run_regex(pattern, (item.get() for item in value))
+            return self.parser.run_regex(pattern, (str(text) for text in value))
+
+        # copied so the function can't alter the cached output of earlier stages. what it
+        # returns is made a list inside the guarded call, so a scalar is a Function Error
+        return self.parser.use_custom_function(value.__class__(value), query, selector)
+
+
+def count(values):
+    return sum(len(value) for value in values)
+
+
+def extract(value):
+    if is_selectors(value):
+        return value.getall()
+    return [plain(result) for result in value]
+
+
+def run_pipeline(parser, rows, fields):
+    return Pipeline(parser, rows, fields).run()
@@ -0,0 +1,326 @@
+from PyQt5.QtWidgets import *
+from PyQt5.QtCore import *
+
+from .runner import QueryRunner
+from .tools_tab_ui import BigHandleSplitter, ResultsModel, ResultsWidget
+from .worker import get_text
+from .pipeline import STAGE_TYPES
+from . import errors
+
+DEFAULT_FUNCTION = """def user_fun(results, selector):
+  # results is the output of the stage before, selector is the row
+  return results"""
+
+
+class ItemsModel(ResultsModel):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.columns = []
+
+    def set_items(self, columns, items):
+        self.columns = columns
+        self.set_results(items)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.columns)
+
+    def cell_text(self, index):
+        # a field can have several values for one row, they go on separate lines
+        return '\n'.join(str(value) for value in self.results[index.row()][index.column()])
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            text = self.cell_text(index)
+            if len(text) > self.display_length:
+                text = text[:self.display_length] + '...'
+            return text
+        if role == Qt.ToolTipRole:
+            text = self.cell_text(index)
+            if len(text) > self.display_length:
+                return text
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Vertical:
+            return section + 1
+        return self.columns[section]
+
+
+class ItemsWidget(ResultsWidget):
+    model_class = ItemsModel
+
+    def add_items(self, columns, items):
+        self.model.set_items(columns, items)
+        if self.model.canFetchMore():
+            self.model.fetchMore()
+        self.resize_visible_rows()
+
+
+class Pipeline(BigHandleSplitter):
+    delay = 500
+
+    def __init__(self, *args, main):
+        super().__init__(*args)
+        self.main = main
+        self.runner = QueryRunner(self)
+        self.runner.finished.connect(self.pipeline_finished)
+        self.runner.failed.connect(self.pipeline_failed)
+        self.runner.progress.connect(self.pipeline_progress)
+        self.runner.stopped.connect(self.pipeline_stopped)
+        self.loaded = None
+        self.pending = False
+        self.debounce = QTimer(self)
+        self.debounce.setSingleShot(True)
+        self.debounce.setInterval(self.delay)
+        self.debounce.timeout.connect(self.request_run)
+        self.initUI()
+
+    def initUI(self):
+        self.setOrientation(Qt.Vertical)
+        top = QFrame()
+        grid = QGridLayout()
+        top.setLayout(grid)
+
+        grid.addWidget(QLabel('Stages, a blank field selects the rows'), 0, 0, 1, 4)
+
+        self.stages = QTableWidget(0, 3)
+        self.stages.setHorizontalHeaderLabels(['Field', 'Type', 'Query'])
+        self.stages.horizontalHeader().setSectionResizeMode(2, QHeaderView.Stretch)
+        # double clicks are handled here so functions can open in a larger editor
+        self.stages.setEditTriggers(
+            QAbstractItemView.EditKeyPressed | QAbstractItemView.AnyKeyPressed | QAbstractItemView.SelectedClicked
+        )
+        self.stages.cellDoubleClicked.connect(self.edit_stage)
+        self.stages.itemChanged.connect(self.stages_edited)
+        grid.addWidget(self.stages, 1, 0, 1, 4)
+
+        add_button = QPushButton('Add Stage')
+        add_button.clicked.connect(lambda: self.add_stage())
+        grid.addWidget(add_button, 2, 0)
+
+        current_button = QPushButton('Add Current Query')
+        current_button.setToolTip('Add the query from the Tools tab as a stage')
+        current_button.clicked.connect(self.add_current_query)
+        grid.addWidget(current_button, 2, 1)
+
+        remove_button = QPushButton('Remove Stage')
+        remove_button.clicked.connect(self.remove_stage)
+        grid.addWidget(remove_button, 2, 2)
+
+        move_frame = QFrame()
+        move_box = QHBoxLayout()
+        move_box.setContentsMargins(0, 0, 0, 0)
+        move_frame.setLayout(move_box)
+        up_button = QPushButton('Move Up')
+        up_button.clicked.connect(lambda: self.move_stage(-1))
+        move_box.addWidget(up_button)
+        down_button = QPushButton('Move Down')
+        down_button.clicked.connect(lambda: self.move_stage(1))
+        move_box.addWidget(down_button)
+        grid.addWidget(move_frame, 2, 3)
+
+        self.run_button = QPushButton('Run Pipeline')
+        self.run_button.clicked.connect(self.run_pipeline)
+        grid.addWidget(self.run_button, 3, 0)
+
+        self.cancel_button = QPushButton('Cancel')
+        self.cancel_button.setDisabled(True)
+        self.cancel_button.clicked.connect(self.runner.cancel)
+        grid.addWidget(self.cancel_button, 3, 1)
+
+        self.live_check = QCheckBox('Run On Edit')
+        self.live_check.setToolTip('Run again after each edit, only the edited stage and those after it are run')
+        grid.addWidget(self.live_check, 3, 2)
+
+        self.message = QLabel()
+        self.message.setWordWrap(True)
+        grid.addWidget(self.message, 4, 0, 1, 4)
+        self.addWidget(top)
+
+        self.items = ItemsWidget()
+        self.addWidget(self.items)
+
+        self.timings = QTableWidget(0, 4)
+        self.timings.setHorizontalHeaderLabels(['Stage', 'Time (ms)', 'Results', 'Cached'])
+        self.timings.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.timings.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.addWidget(self.timings)
+
+        self.add_stage('', 'css', '')
+
+    def add_stage(self, field='', stage_type='css', query='', row=None):
+        if row is None:
+            current = self.stages.currentRow()
+            row = current + 1 if current != -1 else self.stages.rowCount()
+            # new stages carry on the field of the stage they follow
+            if current != -1 and not field:
+                field = self.stages.item(current, 0).text()
+        self.stages.blockSignals(True)
+        self.stages.insertRow(row)
+        self.stages.setItem(row, 0, QTableWidgetItem(field))
+        type_box = QComboBox()
+        type_box.addItems(STAGE_TYPES)
+        type_box.setCurrentText(stage_type)
+        type_box.currentTextChanged.connect(self.type_changed)
+        self.stages.setCellWidget(row, 1, type_box)
+        query_item = QTableWidgetItem()
+        self.stages.setItem(row, 2, query_item)
+        self.set_query(row, query)
+        self.stages.blockSignals(False)
+        self.stages.setCurrentCell(row, 2)
+
+    def add_current_query(self):
+        query, query_type = self.main.queries.query_section.get_query()
+        if query.strip():
+            self.add_stage(stage_type=query_type, query=query)
+            self.stages_edited()
+
+    def remove_stage(self):
+        row = self.stages.currentRow()
+        if row != -1:
+            self.stages.removeRow(row)
+            self.stages_edited()
+
+    def move_stage(self, offset):
+        row = self.stages.currentRow()
+        target = row + offset
+        if row == -1 or not 0 <= target < self.stages.rowCount():
+            return
+        field, stage_type, query = self.get_stage(row)
+        self.stages.removeRow(row)
+        self.add_stage(field, stage_type, query, target)
+        self.stages_edited()
+
+    def get_stage(self, row):
+        query_item = self.stages.item(row, 2)
+        query = query_item.data(Qt.UserRole)
+        if query is None:
+            query = query_item.text()
+        return self.stages.item(row, 0).text().strip(), self.stages.cellWidget(row, 1).currentText(), query
+
+    def set_query(self, row, query):
+        item = self.stages.item(row, 2)
+        if self.stages.cellWidget(row, 1).currentText() == 'function':
+            # the code is kept whole, the cell shows its first line
+            item.setData(Qt.UserRole, query)
+            item.setText(query.strip().split('\n')[0] if query.strip() else '')
+            item.setToolTip(query)
+            item.setFlags(item.flags() & ~Qt.ItemIsEditable)
+        else:
+            item.setData(Qt.UserRole, None)
+            item.setText(query)
+            item.setToolTip('')
+            item.setFlags(item.flags() | Qt.ItemIsEditable)
+
+    def type_changed(self, stage_type):
+        for row in range(self.stages.rowCount()):
+            if self.stages.cellWidget(row, 1) is self.sender():
+                query = DEFAULT_FUNCTION if stage_type == 'function' else ''
+                self.stages.blockSignals(True)
+                self.set_query(row, query)
+                self.stages.blockSignals(False)
+        self.stages_edited()
+
+    def edit_stage(self, row, column):
+        _, stage_type, query = self.get_stage(row)
+        if column != 2 or stage_type != 'function':
+            self.stages.editItem(self.stages.item(row, column))
+            return
+        code, accepted = QInputDialog.getMultiLineText(self, 'Function Stage', 'Function', query)
+        if accepted:
+            self.stages.blockSignals(True)
+            self.set_query(row, code)
+            self.stages.blockSignals(False)
+            self.stages_edited()
+
+    def get_pipeline(self):
+        rows = []
+        fields = {}
+        for row in range(self.stages.rowCount()):
+            field, stage_type, query = self.get_stage(row)
+            if field:
+                fields.setdefault(field, []).append((stage_type, query))
+            else:
+                rows.append((stage_type, query))
+        return rows, list(fields.items())
+
+    def stages_edited(self):
+        if self.live_check.isChecked():
+            self.debounce.start()
+
+    def request_run(self):
+        # a running pipeline is left to finish so the worker keeps its cached
+        # stages, the newest stages are sent straight after
+        if self.runner.is_running():
+            self.pending = True
+            return
+        self.run_pipeline()
+
+    def dispatch_pending(self):
+        if not self.pending:
+            return False
+        self.pending = False
+        self.run_pipeline()
+        return True
+
+    def run_pipeline(self):
+        selector = self.main.queries.selector
+        if selector is None:
+            return
+        if selector is not self.loaded:
+            self.runner.load(get_text(selector))
+            self.loaded = selector
+        rows, fields = self.get_pipeline()
+        self.run_button.setDisabled(True)
+        self.cancel_button.setEnabled(True)
+        self.message.setText('Running')
+        self.runner.pipeline(
+            rows,
+            fields,
+            self.main.queries.status.get_timeout(),
+            self.main.queries.status.get_memory_limit(),
+        )
+
+    def pipeline_progress(self, elapsed):
+        self.message.setText(f'Running {elapsed:.1f}s')
+
+    def pipeline_finished(self, result):
+        # results for stages that have been edited since are dropped
+        if self.dispatch_pending():
+            return
+        self.reset_buttons()
+        self.items.add_items(result['columns'], result['items'])
+        self.timings.setRowCount(len(result['stages']))
+        for row, stage in enumerate(result['stages']):
+            self.timings.setItem(row, 0, QTableWidgetItem(stage['name']))
+            for column, value in ((1, round(stage['time'] * 1000, 3)), (2, stage['count'])):
+                item = QTableWidgetItem()
+                item.setData(Qt.DisplayRole, value)
+                self.timings.setItem(row, column, item)
+            self.timings.setItem(row, 3, QTableWidgetItem('Yes' if stage['cached'] else 'No'))
+        total = sum(stage['time'] for stage in result['stages'])
+        self.message.setText(f"{len(result['items'])} items in {total * 1000:.1f}ms")
+
+    def pipeline_failed(self, title, message, error_type):
+        if self.dispatch_pending():
+            return
+        self.reset_buttons()
+        self.message.setText(title)
+        # errors while typing are shown in the message rather than a dialog
+        if not self.live_check.isChecked():
+            errors.show_error_dialog(self, title, message, error_type)
+
+    def pipeline_stopped(self):
+        self.pending = False
+        self.reset_buttons()
+        self.message.setText('Cancelled')
+
+    def reset_buttons(self):
+        self.run_button.setEnabled(True)
+        self.cancel_button.setDisabled(True)
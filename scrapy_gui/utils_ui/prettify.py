@@ -0,0 +1,78 @@
+from html import escape
+
+from lxml import etree
+
+VOID_TAGS = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input',
+    'link', 'meta', 'param', 'source', 'track', 'wbr',
+}
+RAW_TEXT_TAGS = {'script', 'style'}
+
+
+def get_selector(selector):
+    # scrapy responses keep their parsel selector on an attribute
+    return getattr(selector, 'selector', selector)
+
+
+def has_doctype(text):
+    # lxml reports a default doctype for pages that never declared one
+    return '<!doctype' in text[:1024].lower()
+
+
+def prettify_selector(selector, include_doctype=True):
+    selector = get_selector(selector)
+    root = selector.root
+    if getattr(selector, 'type', 'html') == 'xml':
+        return etree.tostring(root, encoding='unicode', pretty_print=True)
+    return prettify(root, include_doctype=include_doctype)
+
+
+def start_tag(element):
+    attributes = ''.join(
+        f' {name}="{escape(value)}"' for name, value in element.attrib.items()
+    )
+    return f'<{element.tag}{attributes}>'
+
+
+def prettify(root, indent=' ', include_doctype=True):
+    # bs4 style output built straight from the parsed lxml tree, so the page
+    # doesn't need to be parsed a second time
+    if not isinstance(root, etree._Element):
+        return str(root)
+
+    lines = []
+    doctype = root.getroottree().docinfo.doctype
+    if doctype and include_doctype:
+        lines.append(doctype)
+
+    def add_text(text, depth, raw=False):
+        if text:
+            text = text.strip()
+            if text:
+                lines.append(indent * depth + (text if raw else escape(text, quote=False)))
+
+    stack = [(root, 0, False)]
+    while stack:
+        element, depth, closing = stack.pop()
+        padding = indent * depth
+        if closing:
+            lines.append(f'{padding}</{element.tag}>')
+            add_text(element.tail, depth)
+            continue
+
+        if not isinstance(element.tag, str):
+            # comments and processing instructions
+            lines.append(padding + etree.tostring(element, encoding='unicode', with_tail=False))
+            add_text(element.tail, depth)
+            continue
+
+        lines.append(padding + start_tag(element))
+        if element.tag in VOID_TAGS:
+            add_text(element.tail, depth)
+            continue
+        stack.append((element, depth, True))
+        add_text(element.text, depth + 1, element.tag in RAW_TEXT_TAGS)
+        for child in reversed(element):
+            stack.append((child, depth + 1, False))
+
+    return '\n'.join(lines)
@@ -0,0 +1,92 @@
+from contextlib import contextmanager
+import cProfile
+import io
+import pstats
+import time
+import tracemalloc
+
+
+class Stage:
+    def __init__(self, name):
+        self.name = name
+        self.time = 0
+        self.count = None
+        self.memory = None
+        self.cached = False
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'time': self.time,
+            'count': self.count,
+            'memory': self.memory,
+            'cached': self.cached,
+        }
+
+
+class QueryProfile:
+    function_stats_lines = 40
+
+    def __init__(self, track_memory=False, profile_function=False):
+        self.track_memory = track_memory
+        self.profile_function = profile_function
+        self.stages = []
+        self.function_stats = None
+
+    @contextmanager
+    def stage(self, name):
+        stage = Stage(name)
+        if self.track_memory:
+            before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield stage
+        finally:
+            stage.time = time.perf_counter() - start
+            if self.track_memory:
+                # only python allocations are traced, lxml's own trees are not included
+                stage.memory = tracemalloc.get_traced_memory()[0] - before
+            self.stages.append(stage)
+
+    @contextmanager
+    def tracing(self):
+        started = self.track_memory and not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        try:
+            yield
+        finally:
+            if started:
+                tracemalloc.stop()
+
+    def call_function(self, function, *args):
+        if not self.profile_function:
+            return function(*args)
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(function, *args)
+        finally:
+            stream = io.StringIO()
+            stats = pstats.Stats(profiler, stream=stream)
+            stats.sort_stats('cumulative').print_stats(self.function_stats_lines)
+            self.function_stats = stream.getvalue()
+
+    def to_dict(self):
+        return {
+            'stages': [stage.to_dict() for stage in self.stages],
+            'function_stats': self.function_stats,
+        }
+
+
+class NullProfile(QueryProfile):
+    # stands in when nothing is being recorded so the parser needs no checks
+
+    @contextmanager
+    def stage(self, name):
+        yield Stage(name)
+
+    def to_dict(self):
+        return None
+
+
+NULL_PROFILE = NullProfile()
@@ -0,0 +1,144 @@
+from PyQt5.QtWidgets import *
+from PyQt5.QtCore import *
+
+import json
+
+from .tools_tab_ui import BigHandleSplitter
+from . import errors
+
+
+def milliseconds(seconds):
+    if seconds is None:
+        return None
+    return round(seconds * 1000, 2)
+
+
+def number_item(value):
+    # numbers as display data so the columns sort numerically
+    item = QTableWidgetItem()
+    if value is not None:
+        item.setData(Qt.DisplayRole, value)
+    return item
+
+
+class Profiler(BigHandleSplitter):
+    max_history = 200
+
+    def __init__(self, *args, main):
+        super().__init__(*args)
+        self.main = main
+        self.history = []
+        self.initUI()
+        self.main.queries.profiled.connect(self.add_run)
+
+    def initUI(self):
+        self.setOrientation(Qt.Vertical)
+        top = QFrame()
+        grid = QGridLayout()
+        top.setLayout(grid)
+
+        self.memory_check = QCheckBox('Track Memory')
+        self.memory_check.setToolTip('Record python memory allocated by each stage, queries run slower while on')
+        self.memory_check.toggled.connect(self.set_options)
+        grid.addWidget(self.memory_check, 0, 0)
+
+        self.function_check = QCheckBox('Profile Function')
+        self.function_check.setToolTip('Run the custom function under cProfile')
+        self.function_check.toggled.connect(self.set_options)
+        grid.addWidget(self.function_check, 0, 1)
+
+        export_button = QPushButton('Export JSON')
+        export_button.clicked.connect(self.export)
+        grid.addWidget(export_button, 0, 2)
+
+        clear_button = QPushButton('Clear')
+        clear_button.clicked.connect(self.clear)
+        grid.addWidget(clear_button, 0, 3)
+
+        self.runs = QTableWidget(0, 6)
+        self.runs.setHorizontalHeaderLabels(['Time', 'Query', 'Type', 'Status', 'Results', 'Total (ms)'])
+        self.runs.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)
+        self.runs.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.runs.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.runs.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.runs.itemSelectionChanged.connect(self.show_selected)
+        grid.addWidget(self.runs, 1, 0, 1, 4)
+        self.addWidget(top)
+
+        bottom = BigHandleSplitter(Qt.Horizontal)
+        self.stages = QTableWidget(0, 5)
+        self.stages.setHorizontalHeaderLabels(['Stage', 'Time (ms)', 'Results', 'Memory (KB)', 'Cached'])
+        self.stages.horizontalHeader().setStretchLastSection(True)
+        self.stages.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        bottom.addWidget(self.stages)
+
+        self.function_stats = QPlainTextEdit()
+        self.function_stats.setReadOnly(True)
+        self.function_stats.setLineWrapMode(QPlainTextEdit.NoWrap)
+        self.function_stats.setPlaceholderText('Function profile')
+        bottom.addWidget(self.function_stats)
+        self.addWidget(bottom)
+
+    def set_options(self):
+        self.main.queries.profile_options = {
+            'track_memory': self.memory_check.isChecked(),
+            'profile_function': self.function_check.isChecked(),
+        }
+
+    def add_run(self, record):
+        self.history.append(record)
+        if len(self.history) > self.max_history:
+            del self.history[0]
+            self.runs.removeRow(self.runs.rowCount() - 1)
+
+        # newest run first
+        self.runs.insertRow(0)
+        query_item = QTableWidgetItem(' '.join(record['query'].split()))
+        query_item.setToolTip(record['query'])
+        self.runs.setItem(0, 0, QTableWidgetItem(record['time']))
+        self.runs.setItem(0, 1, query_item)
+        self.runs.setItem(0, 2, QTableWidgetItem(record['type']))
+        self.runs.setItem(0, 3, QTableWidgetItem(record['status']))
+        self.runs.setItem(0, 4, number_item(record['count']))
+        self.runs.setItem(0, 5, number_item(milliseconds(record['total'])))
+        self.runs.selectRow(0)
+
+    def selected_record(self):
+        rows = self.runs.selectionModel().selectedRows()
+        if not rows:
+            return None
+        return self.history[len(self.history) - 1 - rows[0].row()]
+
+    def show_selected(self):
+        record = self.selected_record()
+        self.stages.setRowCount(0)
+        self.function_stats.clear()
+        if record is None:
+            return
+
+        for row, stage in enumerate(record['stages']):
+            self.stages.insertRow(row)
+            self.stages.setItem(row, 0, QTableWidgetItem(stage['name']))
+            self.stages.setItem(row, 1, number_item(milliseconds(stage['time'])))
+            self.stages.setItem(row, 2, number_item(stage['count']))
+            memory = stage['memory']
+            self.stages.setItem(row, 3, number_item(None if memory is None else round(memory / 1024, 1)))
+            self.stages.setItem(row, 4, QTableWidgetItem('Yes' if stage['cached'] else ''))
+        if record['function_stats']:
+            self.function_stats.setPlainText(record['function_stats'])
+
+    def clear(self):
+        self.history = []
+        self.runs.setRowCount(0)
+        self.stages.setRowCount(0)
+        self.function_stats.clear()
+
+    def export(self):
+        path, _ = QFileDialog.getSaveFileName(self, 'Export Profile', filter='JSON (*.json)')
+        if not path:
+            return
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(self.history, f, indent=2)
+        except OSError as e:
+            errors.show_error_dialog(self, 'Export Error', f'Could not save profile\n\n{e}', 'critical')
@@ -0,0 +1,112 @@
+from parsel.utils import flatten
+from w3lib.html import replace_entities
+import os
+import re
+import time
+
+try:
+    import re2
+except ImportError:
+    # a linear time engine, patterns using features it lacks fall back to the others
+    re2 = None
+
+try:
+    import regex
+except ImportError:
+    # without it a pattern can't be stopped part way, only the runner's timeout applies
+    regex = None
+
+ENGINES = ['re2', 'regex', 're']
+# kept short so a runaway pattern stops with an error well before the query's own limit
+DEFAULT_TIMEOUT = 5
+
+
+class RegexTimeout(Exception):
+    pass
+
+
+def available_engines():
+    modules = {'re2': re2, 'regex': regex, 're': re}
+    return [engine for engine in ENGINES if modules[engine] is not None]
+
+
+def get_engines():
+    # SCRAPY_GUI_REGEX_ENGINE puts one engine first, re is always the last resort
+    engines = available_engines()
+    preferred = os.environ.get('SCRAPY_GUI_REGEX_ENGINE')
+    if preferred in engines:
+        engines.remove(preferred)
+        engines.insert(0, preferred)
+    return engines
+
+
+def get_timeout(limit=None):
+    # under the query's time limit so the pattern is stopped before the worker is
+    if not limit:
+        return DEFAULT_TIMEOUT
+    return min(DEFAULT_TIMEOUT, limit * 0.8)
+
+
+class Pattern:
+    def __init__(self, pattern, engine, compiled):
+        self.pattern = pattern
+        self.engine = engine
+        self.compiled = compiled
+        self.groupindex = compiled.groupindex
+
+    def findall(self, text, timeout=None):
+        if self.engine == 'regex':
+            return self.compiled.findall(text, timeout=timeout)
+        return self.compiled.findall(text)
+
+    def search(self, text, timeout=None):
+        if self.engine == 'regex':
+            return self.compiled.search(text, timeout=timeout)
+        return self.compiled.search(text)
+
+
+def compile_pattern(pattern, engines=None):
+    error = None
+    for engine in engines or get_engines():
+        try:
+            if engine == 're2':
+                options = re2.Options()
+                options.log_errors = False
+                compiled = re2.compile(pattern, options)
+            elif engine == 'regex':
+                compiled = regex.compile(pattern)
+            else:
+                compiled = re.compile(pattern)
+        except Exception as e:
+            error = e
+            continue
+        return Pattern(pattern, engine, compiled)
+    raise error
+
+
+def extract(pattern, text, deadline=None):
+    # the same rules as parsel's Selector.re, with whatever time is left passed on
+    timeout = None
+    if deadline is not None:
+        timeout = deadline - time.perf_counter()
+        if timeout <= 0:
+            raise RegexTimeout
+    try:
+        if 'extract' in pattern.groupindex:
+            match = pattern.search(text, timeout)
+            extracted = match.group('extract') if match is not None else None
+            strings = [extracted] if extracted is not None else []
+        else:
+            strings = pattern.findall(text, timeout)
+    except TimeoutError:
+        raise RegexTimeout
+    return [replace_entities(string, keep=['lt', 'amp']) for string in flatten(strings)]
+
+
+def match_all(pattern, texts, timeout=None):
+    # one time limit covers every text, so many slow ones are stopped too
+    deadline = time.perf_counter() + timeout if timeout else None
+    results = []
+    for text in texts:
+        results.extend(extract(pattern, text, deadline))
+    return results
@@ -0,0 +1,172 @@
+from PyQt5.QtWidgets import *
+from PyQt5.QtCore import *
+from PyQt5.QtGui import *
+
+from .runner import QueryRunner
+from .tools_tab_ui import BigHandleSplitter
+from .worker import get_text
+from . import errors
+
+CHANGE_COLOURS = {
+    'added': QColor(220, 255, 220),
+    'rendered only': QColor(220, 255, 220),
+    'removed': QColor(255, 220, 220),
+    'raw only': QColor(255, 220, 220),
+    'attributes': QColor(255, 255, 200),
+    'text': QColor(255, 255, 200),
+}
+
+
+def fill_table(table, rows):
+    # the first column is the kind of change, which sets the row colour
+    table.setRowCount(len(rows))
+    for row, values in enumerate(rows):
+        colour = CHANGE_COLOURS.get(values[0])
+        for column, value in enumerate(values):
+            item = QTableWidgetItem(value)
+            item.setToolTip(value[:2000])
+            if colour is not None:
+                item.setBackground(colour)
+            table.setItem(row, column, item)
+
+
+class RenderedDiff(BigHandleSplitter):
+    default_timeout = 120
+
+    def __init__(self, *args, main):
+        super().__init__(*args)
+        self.main = main
+        self.rendered = None
+        self.rendered_url = None
+        # large pages take a while to diff, so it runs in its own worker
+        self.runner = QueryRunner(self)
+        self.runner.finished.connect(self.compare_finished)
+        self.runner.failed.connect(self.compare_failed)
+        self.runner.progress.connect(self.compare_progress)
+        self.runner.stopped.connect(self.compare_stopped)
+        self.loaded = None
+        self.initUI()
+
+    def initUI(self):
+        self.setOrientation(Qt.Vertical)
+        top = QFrame()
+        grid = QGridLayout()
+        top.setLayout(grid)
+
+        self.capture_check = QCheckBox('Capture Rendered Page')
+        self.capture_check.setToolTip('Keep the html the browser shows, after javascript has run, for each page loaded')
+        grid.addWidget(self.capture_check, 0, 0)
+
+        self.capture_button = QPushButton('Capture Now')
+        self.capture_button.setToolTip('Keep the html the browser shows right now')
+        self.capture_button.clicked.connect(self.capture)
+        grid.addWidget(self.capture_button, 0, 1)
+
+        self.compare_button = QPushButton('Compare Query')
+        self.compare_button.setToolTip('Run the Tools tab query on the raw and the rendered html and compare them')
+        self.compare_button.clicked.connect(self.run_compare)
+        grid.addWidget(self.compare_button, 0, 2)
+
+        self.cancel_button = QPushButton('Cancel')
+        self.cancel_button.setDisabled(True)
+        self.cancel_button.clicked.connect(self.runner.cancel)
+        grid.addWidget(self.cancel_button, 0, 3)
+
+        self.captured_label = QLabel('Nothing captured')
+        grid.addWidget(self.captured_label, 1, 0, 1, 4)
+
+        self.message = QLabel()
+        self.message.setWordWrap(True)
+        grid.addWidget(self.message, 2, 0, 1, 4)
+        self.addWidget(top)
+
+        self.results = QTableWidget(0, 2)
+        self.results.setHorizontalHeaderLabels(['Found In', 'Result'])
+        self.results.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)
+        self.results.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.addWidget(self.results)
+
+        self.tree = QTableWidget(0, 4)
+        self.tree.setHorizontalHeaderLabels(['Change', 'Path', 'Element', 'Detail'])
+        self.tree.horizontalHeader().setSectionResizeMode(3, QHeaderView.Stretch)
+        self.tree.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.addWidget(self.tree)
+
+    def page_loaded(self):
+        if self.capture_check.isChecked():
+            self.capture()
+
+    def capture(self):
+        # toHtml is asynchronous, the page keeps running while it's serialised
+        page = self.main.browser.web.page()
+        url = self.main.browser.get_url()
+        page.toHtml(lambda html: self.set_rendered(url, html))
+
+    def set_rendered(self, url, html):
+        self.rendered = html
+        self.rendered_url = url
+        self.captured_label.setText(f'Captured {len(html):,} characters from {url}')
+
+    def run_compare(self):
+        selector = self.main.queries.selector
+        if selector is None or self.rendered is None:
+            self.message.setText('Load a page and capture its rendered html first')
+            return
+        if selector is not self.loaded:
+            self.runner.load(get_text(selector))
+            self.loaded = selector
+
+        query, query_type, regex, function = self.main.queries.get_query_details()
+        self.compare_button.setDisabled(True)
+        self.cancel_button.setEnabled(True)
+        self.message.setText('Running')
+        self.runner.compare(
+            self.rendered,
+            query,
+            query_type,
+            regex,
+            function,
+            self.main.queries.status.get_timeout() or self.default_timeout,
+            self.main.queries.status.get_memory_limit(),
+        )
+
+    def compare_progress(self, elapsed):
+        self.message.setText(f'Running {elapsed:.1f}s')
+
+    def compare_finished(self, report):
+        self.reset_buttons()
+        lines = []
+
+        results = report['results']
+        fill_table(self.results, results['rows'] if results is not None else [])
+        if results is not None:
+            lines.append(
+                f"Query: {results['raw_count']} raw results, {results['rendered_count']} rendered results, "
+                f"{results['same']} in both"
+                + (', only the first differences are listed' if results['truncated'] else '')
+            )
+
+        tree = report['tree']
+        fill_table(self.tree, [
+            [change['change'], change['path'], change['element'], change['detail']]
+            for change in tree['changes']
+        ])
+        lines.append(
+            f"Tree: {tree['raw_elements']} raw elements, {tree['rendered_elements']} rendered elements, "
+            f"{len(tree['changes'])} changes found in {tree['time']:.2f}s"
+            + (', only the first changes are listed' if tree['truncated'] else '')
+        )
+        self.message.setText('\n'.join(lines))
+
+    def compare_failed(self, title, message, error_type):
+        self.reset_buttons()
+        self.message.setText(title)
+        errors.show_error_dialog(self, title, message, error_type)
+
+    def compare_stopped(self):
+        self.reset_buttons()
+        self.message.setText('Cancelled')
+
+    def reset_buttons(self):
+        self.compare_button.setEnabled(True)
+        self.cancel_button.setDisabled(True)
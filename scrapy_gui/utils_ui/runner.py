@@ -0,0 +1,203 @@
+from PyQt5.QtCore import *
+
+import time
+
+from .worker import QueryWorker
+from .profiler import Stage
+
+
+class QueryRunner(QObject):
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str, str, str)
+    progress = pyqtSignal(float)
+    stopped = pyqtSignal()
+
+    poll_interval = 50
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.worker = QueryWorker()
+        self.timeout = None
+        self.started = None
+        self.last_profile = None
+        self.timer = QTimer(self)
+        self.timer.setInterval(self.poll_interval)
+        self.timer.timeout.connect(self.check)
+
+    def is_running(self):
+        return self.started is not None
+
+    def load(self, text):
+        if self.is_running():
+            self.cancel()
+        self.worker.load(text)
+
+    def run(self, query, query_type, regex=None, function=None, timeout=None, memory_limit=None,
+            profile_options=None):
+        if self.is_running():
+            self.cancel()
+        self.start_timer(timeout)
+        # the worker also limits its own cpu time in case it can't be reached
+        self.worker.query(query, query_type, regex, function, timeout, memory_limit, profile_options)
+
+    def benchmark(self, query, query_type, alternatives=(), suggest=True, repeat=5, timeout=None):
+        if self.is_running():
+            self.cancel()
+        self.start_timer(timeout)
+        self.worker.benchmark(query, query_type, alternatives, suggest, repeat)
+
+    def locate(self, query, query_type, timeout=None):
+        if self.is_running():
+            self.cancel()
+        self.start_timer(timeout)
+        self.worker.locate(query, query_type)
+
+    def pick(self, steps, timeout=None):
+        if self.is_running():
+            self.cancel()
+        self.start_timer(timeout)
+        self.worker.pick(steps)
+
+    def compare(self, text, query, query_type, regex=None, function=None, timeout=None, memory_limit=None):
+        if self.is_running():
+            self.cancel()
+        self.start_timer(timeout)
+        self.worker.compare(text, query, query_type, regex, function, timeout, memory_limit)
+
+    def pipeline(self, rows, fields, timeout=None, memory_limit=None):
+        if self.is_running():
+            self.cancel()
+        self.start_timer(timeout)
+        self.worker.pipeline(rows, fields, timeout, memory_limit)
+
+    def start_timer(self, timeout):
+        self.timeout = timeout
+        self.started = time.perf_counter()
+        self.last_profile = None
+        self.timer.start()
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def receive(self):
+        # a profile, when one was asked for, arrives just ahead of the results
+        while self.worker.poll():
+            stage = Stage('receive')
+            start = time.perf_counter()
+            kind, payload = self.worker.receive()
+            stage.time = time.perf_counter() - start
+            if kind == 'profile':
+                self.last_profile = payload
+                continue
+            if self.last_profile is not None:
+                self.last_profile['stages'].append(stage.to_dict())
+            return kind, payload
+        return None
+
+    def check(self):
+        try:
+            message = self.receive()
+        except (EOFError, OSError):
+            message = None
+
+        if message is not None:
+            kind, payload = message
+            self.timer.stop()
+            self.started = None
+            if kind == 'error':
+                self.failed.emit(*payload)
+            else:
+                self.finished.emit(payload)
+            return
+
+        elapsed = self.elapsed()
+        if not self.worker.is_alive():
+            self.stop()
+            self.failed.emit(
+                'Query Error',
+                'The query worker stopped unexpectedly',
+                'critical',
+            )
+        elif self.timeout and elapsed > self.timeout:
+            self.stop()
+            self.failed.emit(
+                'Query Timeout',
+                f'Query was stopped after running for {self.timeout} seconds',
+                'critical',
+            )
+        else:
+            self.progress.emit(elapsed)
+
+    def stop(self):
+        # a hung regex or user function can't be interrupted, so the worker is
+        # replaced and reloads the current document when next needed
+        self.timer.stop()
+        self.started = None
+        self.worker.terminate()
+
+    def cancel(self):
+        if not self.is_running():
+            return
+        self.stop()
+        self.stopped.emit()
+
+    def shutdown(self):
+        self.timer.stop()
+        self.started = None
+        self.worker.terminate()
+
+
+class LiveRunner(QueryRunner):
+    preview_ready = pyqtSignal(int, list)
+    preview_failed = pyqtSignal(str, str)
+
+    delay = 250
+    live_timeout = 5
+    limit = 20
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pending = None
+        self.debounce = QTimer(self)
+        self.debounce.setSingleShot(True)
+        self.debounce.setInterval(self.delay)
+        self.debounce.timeout.connect(self.dispatch)
+        self.finished.connect(self.preview_finished)
+        self.failed.connect(self.preview_error)
+        self.progress.connect(self.preview_progress)
+
+    def request(self, query, query_type):
+        # only the newest request is kept, older ones are never sent
+        self.pending = (query, query_type)
+        self.debounce.start()
+
+    def dispatch(self):
+        if self.pending is None:
+            return
+        if self.is_running():
+            # a preview that has only just started is left to finish so the worker keeps
+            # its parsed document and caches. one still running past the debounce is
+            # superseded, so the worker is replaced and reloads the page
+            if self.elapsed() < self.delay / 1000:
+                return
+            self.stop()
+        query, query_type = self.pending
+        self.pending = None
+        self.start_timer(self.live_timeout)
+        self.worker.preview(query, query_type, self.limit)
+
+    def preview_progress(self, elapsed):
+        # typing has paused and a request is waiting behind the running preview
+        if not self.debounce.isActive():
+            self.dispatch()
+
+    def preview_finished(self, payload):
+        if self.pending is None:
+            count, results = payload
+            self.preview_ready.emit(count, results)
+        self.dispatch()
+
+    def preview_error(self, title, message, error_type):
+        if self.pending is None:
+            self.preview_failed.emit(title, message)
+        self.dispatch()
@@ -0,0 +1,109 @@
+from collections import OrderedDict
+import gzip
+import os
+import tempfile
+
+from .parser import fingerprint
+from .memory import make_selector, measure_memory
+
+
+def read_document(path):
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8', errors='replace') as f:
+        return f.read()
+
+
+class Document:
+    def __init__(self, key, url, path, size):
+        self.key = key
+        self.url = url
+        self.path = path
+        self.size = size
+        self.selector = None
+        self.memory = 0
+        self.memory_parts = {}
+
+    def is_parsed(self):
+        return self.selector is not None
+
+
+class DocumentStore:
+    # keeps every loaded page as gzipped html on disk, and as many parsed
+    # trees in memory as fit in the budget, least recently used first out
+    def __init__(self, directory=None, memory_budget=512 * 1024 * 1024, lean=False):
+        if directory is None:
+            self.temp_dir = tempfile.TemporaryDirectory(prefix='scrapy_gui_')
+            directory = self.temp_dir.name
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.memory_budget = memory_budget
+        # lean documents keep only their tree, the text is read back from disk when needed
+        self.lean = lean
+        self.documents = OrderedDict()
+
+    def __len__(self):
+        return len(self.documents)
+
+    def __iter__(self):
+        return iter(list(self.documents.values()))
+
+    def __contains__(self, key):
+        return key in self.documents
+
+    def add(self, url, text, selector=None):
+        key = fingerprint(text)
+        document = self.documents.get(key)
+        if document is None:
+            path = os.path.join(self.directory, f'{key}.html.gz')
+            with gzip.open(path, 'wt', encoding='utf-8', compresslevel=6) as f:
+                f.write(text)
+            document = Document(key, url, path, len(text))
+            self.documents[key] = document
+        document.url = url
+        self.set_selector(document, selector or make_selector(text, self.lean), text)
+        return document
+
+    def set_selector(self, document, selector, text):
+        document.selector = selector
+        document.memory_parts = measure_memory(selector, len(text))
+        document.memory = sum(document.memory_parts.values())
+        self.documents.move_to_end(document.key)
+        self.evict()
+
+    def get(self, key):
+        return self.documents[key]
+
+    def get_text(self, key):
+        return read_document(self.documents[key].path)
+
+    def get_selector(self, key):
+        document = self.documents[key]
+        if document.is_parsed():
+            self.documents.move_to_end(key)
+        else:
+            # evicted trees are rebuilt from the compressed copy on disk
+            text = self.get_text(key)
+            self.set_selector(document, make_selector(text, self.lean), text)
+        return document.selector
+
+    def memory_used(self):
+        return sum(document.memory for document in self.documents.values() if document.is_parsed())
+
+    def evict(self):
+        parsed = [document for document in self.documents.values() if document.is_parsed()]
+        used = sum(document.memory for document in parsed)
+        # the newest document is always kept, even when it's over budget by itself
+        for document in parsed[:-1]:
+            if used <= self.memory_budget:
+                break
+            used -= document.memory
+            document.selector = None
+            document.memory = 0
+            document.memory_parts = {}
+
+    def remove(self, key):
+        document = self.documents.pop(key)
+        os.remove(document.path)
+
+    def paths(self):
+        return [document.path for document in self.documents.values()]
@@ -0,0 +1,128 @@
+from PyQt5.QtWidgets import *
+from PyQt5.QtCore import *
+
+from ..snapshots import SnapshotError, SnapshotStore, get_snapshot_dir
+from . import errors
+
+
+class Snapshots(QWidget):
+    def __init__(self, *args, main, directory=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.main = main
+        self.store = None
+        self.directory = directory
+        self.initUI()
+
+    def initUI(self):
+        grid = QGridLayout()
+        self.setLayout(grid)
+
+        # off by default, pages fetched with the browser's cookies can hold logged in content
+        self.save_check = QCheckBox('Save Loaded Pages')
+        self.save_check.setToolTip(
+            'Keep a snapshot of every page loaded from now on so it can be opened again offline, '
+            f'they are written to {self.directory or get_snapshot_dir()} until removed here'
+        )
+        grid.addWidget(self.save_check, 0, 0)
+
+        self.filter_entry = QLineEdit()
+        self.filter_entry.setPlaceholderText('Filter by url')
+        self.filter_entry.textChanged.connect(self.apply_filter)
+        grid.addWidget(self.filter_entry, 0, 1, 1, 3)
+
+        self.table = QTableWidget(0, 4)
+        self.table.setHorizontalHeaderLabels(['Saved', 'Url', 'Size (KB)', 'Stored (KB)'])
+        self.table.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.doubleClicked.connect(self.open_snapshot)
+        grid.addWidget(self.table, 1, 0, 1, 4)
+
+        open_button = QPushButton('Open')
+        open_button.clicked.connect(self.open_snapshot)
+        grid.addWidget(open_button, 2, 0)
+
+        remove_button = QPushButton('Remove')
+        remove_button.clicked.connect(self.remove_snapshots)
+        grid.addWidget(remove_button, 2, 1)
+
+        self.location_label = QLabel()
+        self.location_label.setTextInteractionFlags(Qt.TextSelectableByMouse)
+        grid.addWidget(self.location_label, 2, 2, 1, 2)
+
+    def get_store(self):
+        # opened on first use so a bad snapshot folder doesn't stop the window opening
+        if self.store is None:
+            try:
+                self.store = SnapshotStore(self.directory)
+            except OSError as e:
+                self.save_check.setChecked(False)
+                errors.show_error_dialog(self, 'Snapshot Error', f'Could not open the snapshot folder\n\n{e}', 'critical')
+                return None
+            self.location_label.setText(self.store.directory)
+            self.refresh()
+        return self.store
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.get_store()
+
+    def save(self, url, body, headers=None):
+        if not self.save_check.isChecked():
+            return
+        store = self.get_store()
+        if store is None:
+            return
+        try:
+            store.add(url, body, headers)
+        except OSError as e:
+            self.save_check.setChecked(False)
+            errors.show_error_dialog(self, 'Snapshot Error', f'Could not save the page, saving is now off\n\n{e}', 'critical')
+            return
+        self.refresh()
+
+    def refresh(self):
+        self.table.setSortingEnabled(False)
+        self.table.setRowCount(0)
+        snapshots = sorted(self.store, key=lambda snapshot: snapshot.time, reverse=True)
+        self.table.setRowCount(len(snapshots))
+        for row, snapshot in enumerate(snapshots):
+            time_item = QTableWidgetItem(snapshot.time.replace('T', ' '))
+            time_item.setData(Qt.UserRole, snapshot.id)
+            self.table.setItem(row, 0, time_item)
+            url_item = QTableWidgetItem(snapshot.url)
+            url_item.setToolTip(snapshot.url)
+            self.table.setItem(row, 1, url_item)
+            for column, size in ((2, snapshot.size), (3, snapshot.stored_size)):
+                size_item = QTableWidgetItem()
+                size_item.setData(Qt.DisplayRole, round(size / 1024, 1))
+                self.table.setItem(row, column, size_item)
+        self.table.setSortingEnabled(True)
+        self.apply_filter(self.filter_entry.text())
+
+    def apply_filter(self, text):
+        text = text.lower()
+        for row in range(self.table.rowCount()):
+            self.table.setRowHidden(row, text not in self.table.item(row, 1).text().lower())
+
+    def selected_ids(self):
+        rows = {index.row() for index in self.table.selectedIndexes()}
+        return [self.table.item(row, 0).data(Qt.UserRole) for row in sorted(rows)]
+
+    def open_snapshot(self):
+        ids = self.selected_ids()
+        if not ids or self.get_store() is None:
+            return
+        snapshot = self.store.get(ids[0])
+        try:
+            text = self.store.get_text(snapshot.id)
+        except (OSError, RuntimeError, SnapshotError) as e:
+            errors.show_error_dialog(self, 'Snapshot Error', f'Could not open the snapshot\n\n{e}', 'critical')
+            return
+        selector = self.main.documents.add_document(snapshot.url, text)
+        self.main.show_document(selector, text)
+
+    def remove_snapshots(self):
+        for snapshot_id in self.selected_ids():
+            self.store.remove(snapshot_id)
+        self.refresh()
@@ -2,15 +2,110 @@ from PyQt5.QtWidgets import *
 from PyQt5.QtCore import *
 from PyQt5.QtGui import *
 
-from bs4 import BeautifulSoup
+from bisect import bisect_left
+import re
+import sys
+
+from .parser import LRUCache, fingerprint
+from .prettify import prettify_selector, has_doctype
+
+
+def compile_search(search_term, use_regex=False, case_sensitive=False):
+    if not use_regex:
+        search_term = re.escape(search_term)
+    flags = 0 if case_sensitive else re.IGNORECASE
+    return re.compile(search_term, flags)
+
+
+def utf16_length(text):
+    return len(text.encode('utf-16-le')) // 2
+
+
+def iter_matches(pattern, text):
+    # qt positions count utf-16 units, so characters outside the BMP like emoji
+    # take two. the units are added up as matches are found, not per match
+    wide = not text.isascii()
+    last = units = 0
+    for match in pattern.finditer(text):
+        start, end = match.span()
+        # zero width regex matches can't be highlighted
+        if start == end:
+            continue
+        if wide:
+            units += utf16_length(text[last:start])
+            last = start
+            start, end = units, units + utf16_length(text[start:end])
+        yield start, end
+
+
+def iter_document_matches(document, expression):
+    # used when the text only lives in the Qt document, as in lean mode
+    cursor = QTextCursor(document)
+    while True:
+        cursor = document.find(expression, cursor)
+        if cursor.isNull():
+            return
+        start, end = cursor.selectionStart(), cursor.selectionEnd()
+        if start == end:
+            if end + 1 >= document.characterCount():
+                return
+            cursor.setPosition(end + 1)
+            continue
+        yield start, end
+
+
+def compile_document_search(search_term, use_regex=False, case_sensitive=False):
+    if not use_regex:
+        search_term = QRegularExpression.escape(search_term)
+    expression = QRegularExpression(search_term)
+    if not case_sensitive:
+        expression.setPatternOptions(QRegularExpression.CaseInsensitiveOption)
+    return expression
+
+
+def iter_text_chunks(text, size):
+    for start in range(0, len(text), size):
+        yield text[start:start + size]
+
+
+class PrettifySignals(QObject):
+    done = pyqtSignal(str, str)
+
+
+class PrettifyTask(QRunnable):
+    def __init__(self, key, selector, include_doctype):
+        super().__init__()
+        self.key = key
+        self.selector = selector
+        self.include_doctype = include_doctype
+        self.signals = PrettifySignals()
+
+    def run(self):
+        text = prettify_selector(self.selector, self.include_doctype)
+        self.signals.done.emit(self.key, text)
+
 
 class TextViewer(QWidget):
     current_index = 0
     total_hits = 0
+    search_delay = 300
+    search_budget = 0.02
+    chunk_size = 256 * 1024
+    pretty_cache = LRUCache(8)
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.indexes = None
+        self.indexes = []
+        self.starts = []
+        self.text = ''
+        self.matches = None
+        self.chunks = None
+        self.search_waiting = False
+        self.source_key = None
+        self.pending_source = None
+        self.include_doctype = False
+        self.task = None
+        self.lean = False
         self.initUI()
 
     def initUI(self):
@@ -24,6 +119,7 @@ class TextViewer(QWidget):
         self.search_bar = QLineEdit()
         grid.addWidget(self.search_bar, 0, 0)
         self.search_bar.returnPressed.connect(self.find_pressed)
+        self.search_bar.textChanged.connect(self.search_changed)
 
         self.results = QLabel('0 of 0 Results')
         grid.addWidget(self.results, 0, 2)
@@ -36,59 +132,242 @@ class TextViewer(QWidget):
         previous_button.clicked.connect(self.previous_pressed)
         grid.addWidget(previous_button, 0, 4)
 
-        self.source_text = QTextEdit()
-        grid.addWidget(self.source_text, 1, 0, 1, 5)
+        self.case_check = QCheckBox('Match Case')
+        self.case_check.toggled.connect(self.search_changed)
+        grid.addWidget(self.case_check, 0, 5)
+
+        self.regex_check = QCheckBox('RegEx')
+        self.regex_check.toggled.connect(self.search_changed)
+        grid.addWidget(self.regex_check, 0, 6)
+
+        # QPlainTextEdit lays out lines lazily, which keeps visible range lookups cheap
+        self.source_text = QPlainTextEdit()
+        grid.addWidget(self.source_text, 1, 0, 1, 7)
         self.source_text.setReadOnly(True)
+        self.source_text.setUndoRedoEnabled(False)
+        self.source_text.verticalScrollBar().valueChanged.connect(self.set_format)
+        self.source_text.horizontalScrollBar().valueChanged.connect(self.set_format)
 
         self.keywordFormat = QTextCharFormat()
         self.keywordFormat.setBackground(Qt.yellow)
         self.keywordFormat.setFontWeight(QFont.Bold)
 
+        # searching is restarted a short time after typing stops
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(self.search_delay)
+        self.search_timer.timeout.connect(self.find_pressed)
+
+        # hits are collected a batch at a time so big documents don't block the UI
+        self.stream_timer = QTimer(self)
+        self.stream_timer.timeout.connect(self.collect_matches)
+
+        # large documents are added a chunk at a time so the window stays usable
+        self.load_timer = QTimer(self)
+        self.load_timer.timeout.connect(self.load_chunk)
+
     def setPlainText(self, text):
-        self.source_text.setReadOnly(False)
-        self.source_text.setPlainText(text)
-        self.source_text.setReadOnly(True)
+        self.clear_text()
+        # lean viewers search Qt's copy of the text rather than keeping their own
+        self.text = None if self.lean else text
+        self.load_chunks(iter_text_chunks(text, self.chunk_size))
+
+    def clear_text(self):
+        self.stop_search()
+        self.stop_loading()
+        self.text = ''
+        self.indexes = []
+        self.starts = []
+        self.search_waiting = False
+        self.source_text.clear()
+        self.update_label()
+
+    def load_chunks(self, chunks):
+        self.chunks = chunks
+        self.load_chunk()
+        if self.chunks is not None:
+            self.load_timer.start()
+
+    def load_chunk(self):
+        try:
+            chunk = next(self.chunks)
+        except StopIteration:
+            self.stop_loading()
+            if self.search_waiting:
+                self.search_waiting = False
+                self.find_pressed()
+            return
+        cursor = QTextCursor(self.source_text.document())
+        cursor.movePosition(QTextCursor.End)
+        cursor.insertText(chunk)
 
-    def setPrettyHtml(self, text):
-        # uses bs4 to prettify html input
-        soup = BeautifulSoup(text, 'html.parser')
-        html_out = soup.prettify()
-        self.setPlainText(html_out)
+    def stop_loading(self):
+        self.load_timer.stop()
+        self.chunks = None
+
+    def setSource(self, selector, text):
+        # prettifying is left until the tab is first shown
+        self.source_key = fingerprint(text)
+        self.pending_source = selector
+        self.include_doctype = has_doctype(text)
+        self.task = None
+        if self.isVisible():
+            self.load_source()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.load_source()
+
+    def load_source(self):
+        if self.pending_source is None or self.task is not None:
+            return
+        cached = self.pretty_cache.get(self.source_key)
+        if cached is not None:
+            self.pending_source = None
+            self.setPlainText(cached)
+            return
+        self.setPlainText('Formatting source...')
+        self.task = PrettifyTask(self.source_key, self.pending_source, self.include_doctype)
+        self.task.signals.done.connect(self.source_ready)
+        QThreadPool.globalInstance().start(self.task)
+
+    def source_ready(self, key, text):
+        if not self.lean:
+            self.pretty_cache.put(key, text)
+        if key != self.source_key:
+            return
+        self.task = None
+        self.pending_source = None
+        self.setPlainText(text)
+
+    def set_lean(self, enabled):
+        self.lean = enabled
+        if enabled:
+            self.pretty_cache.clear()
+            if self.text:
+                self.text = None
+
+    def source_memory(self, key):
+        # formatted copies of the page held by the viewer, Qt stores its text as utf-16
+        cached = self.pretty_cache.data.get(key)
+        size = sys.getsizeof(cached) if cached is not None else 0
+        if key == self.source_key and self.pending_source is None:
+            if self.text and self.text is not cached:
+                size += sys.getsizeof(self.text)
+            size += self.source_text.document().characterCount() * 2
+        return size
+
+    def search_changed(self):
+        self.search_timer.start()
 
     def find_pressed(self):
-        self.source_text.setReadOnly(False)
-        self.find_indexes()
+        self.search_timer.stop()
+        if self.chunks is not None:
+            # matches past the chunks added so far would have no place in the
+            # document yet, so the search runs once the last chunk is in
+            self.stop_search()
+            self.search_waiting = True
+            self.results.setText('Loading...')
+            return
+        if not self.find_indexes():
+            return
         self.current_index = 1
-        self.total_hits = len(self.indexes)
         self.set_format()
         self.update_position()
-        self.source_text.setReadOnly(True)
+
+    def find_indexes(self):
+        self.stop_search()
+        self.indexes = []
+        self.starts = []
+        search_term = self.search_bar.text()
+        if not search_term or self.text == '':
+            return True
+        if self.text is None:
+            expression = compile_document_search(
+                search_term,
+                self.regex_check.isChecked(),
+                self.case_check.isChecked(),
+            )
+            if not expression.isValid():
+                return self.invalid_search()
+            self.matches = iter_document_matches(self.source_text.document(), expression)
+        else:
+            try:
+                pattern = compile_search(
+                    search_term,
+                    self.regex_check.isChecked(),
+                    self.case_check.isChecked(),
+                )
+            except re.error:
+                return self.invalid_search()
+            self.matches = iter_matches(pattern, self.text)
+        self.collect_matches()
+        if self.matches is not None:
+            self.stream_timer.start()
+        return True
+
+    def invalid_search(self):
+        self.set_format()
+        self.results.setText('Invalid RegEx')
+        return False
+
+    def collect_matches(self):
+        timer = QElapsedTimer()
+        timer.start()
+        for match in self.matches:
+            self.indexes.append(match)
+            self.starts.append(match[0])
+            if timer.elapsed() > self.search_budget * 1000:
+                break
+        else:
+            self.stop_search()
+        self.total_hits = len(self.indexes)
+        self.set_format()
+        self.update_label()
+
+    def stop_search(self):
+        self.stream_timer.stop()
+        self.matches = None
 
     def make_cursor(self, index):
+        start, end = index
         cursor = self.source_text.textCursor()
-        size = len(self.search_bar.text())
-        cursor.setPosition(index)
-        cursor.setPosition(index + size, QTextCursor.KeepAnchor)
+        cursor.setPosition(start)
+        cursor.setPosition(end, QTextCursor.KeepAnchor)
         return cursor
 
-    def set_format(self):
-        # clear current formatting first
-        cursor = self.source_text.textCursor()
-        cursor.select(QTextCursor.Document)
-        cursor.setCharFormat(QTextCharFormat())
-        cursor.clearSelection()
-
-        for index in self.indexes:
-            cursor = self.make_cursor(index)
-            cursor.setCharFormat(self.keywordFormat)
+    def visible_range(self):
+        block = self.source_text.firstVisibleBlock()
+        start = block.position()
+        offset = self.source_text.contentOffset()
+        height = self.source_text.viewport().height()
+        end = start
+        while block.isValid():
+            end = block.position() + block.length()
+            top = self.source_text.blockBoundingGeometry(block).translated(offset).top()
+            if top > height:
+                break
+            block = block.next()
+        return start, end
 
-    def find_indexes(self):
-        search_term = self.search_bar.text().lower()
-        all_text = self.source_text.toPlainText().lower()
-        if not search_term or not all_text:
-            return
-        del self.indexes
-        self.indexes = [i for i in range(len(all_text)) if all_text.startswith(search_term, i)]
+    def set_format(self):
+        # only matches on screen are highlighted, using extra selections so the
+        # document itself is never reformatted
+        selections = []
+        if self.indexes:
+            start, end = self.visible_range()
+            first = bisect_left(self.starts, start)
+            # include matches starting just off screen on long lines
+            first = max(first - 1, 0)
+            for position in range(first, len(self.indexes)):
+                index = self.indexes[position]
+                if index[0] > end:
+                    break
+                selection = QTextEdit.ExtraSelection()
+                selection.cursor = self.make_cursor(index)
+                selection.format = self.keywordFormat
+                selections.append(selection)
+        self.source_text.setExtraSelections(selections)
 
     def next_pressed(self):
         if not self.indexes:
@@ -110,8 +389,16 @@ class TextViewer(QWidget):
 
     def update_position(self):
         if not self.indexes:
+            self.update_label()
             return
         index = self.indexes[self.current_index - 1]
         cursor = self.make_cursor(index)
         self.source_text.setTextCursor(cursor)
-        self.results.setText(f'{self.current_index} of {self.total_hits} Results')
\ No newline at end of file
+        self.update_label()
+
+    def update_label(self):
+        if not self.indexes:
+            self.current_index = 0
+            self.total_hits = 0
+        total = f'{self.total_hits}+' if self.matches is not None else self.total_hits
+        self.results.setText(f'{self.current_index} of {total} Results')
@@ -1,8 +1,14 @@
 from PyQt5.QtWidgets import *
 from PyQt5.QtCore import *
 
-from .parser import Parser
+from .runner import QueryRunner, LiveRunner
+from .worker import get_text
+from .profiler import Stage
 from . import errors
+from ..export import export_results, query_code
+
+from datetime import datetime
+import time
 
 
 class BigHandleSplitter(QSplitter):
@@ -19,13 +25,25 @@ class BigHandleSplitter(QSplitter):
 
 
 class Queries(BigHandleSplitter):
+    profiled = pyqtSignal(dict)
+
     url = None
     selector = None
     use_re = False
+    default_timeout = 30
+    default_memory_limit = 4096
 
     def __init__(self, *args, main):
         super().__init__(*args)
         self.main = main
+        self.runner = QueryRunner(self)
+        self.runner.finished.connect(self.query_finished)
+        self.runner.failed.connect(self.query_failed)
+        self.runner.progress.connect(self.query_progress)
+        self.runner.stopped.connect(self.query_stopped)
+        self.live_runner = None
+        self.profile_options = {'track_memory': False, 'profile_function': False}
+        self.current_run = None
         self.initUI()
 
     def initUI(self):
@@ -35,6 +53,9 @@ class Queries(BigHandleSplitter):
 
         self.query_section = QueryChoiceEntry(label='Query')
         self.query_section.initUI()
+        self.query_section.live_check.toggled.connect(self.set_live)
+        self.query_section.query.textChanged.connect(self.live_query)
+        self.query_section.type_changed.connect(self.live_query)
         left_frame.addWidget(self.query_section)
 
         left_bottom = QFrame()
@@ -45,14 +66,24 @@ class Queries(BigHandleSplitter):
         self.re_section.initUI()
         left_bottom_box.addWidget(self.re_section)
 
-        run_button = QPushButton('Run Query')
-        run_button.clicked.connect(self.do_query)
-        left_bottom_box.addWidget(run_button)
+        self.run_button = QPushButton('Run Query')
+        self.run_button.clicked.connect(self.do_query)
+        left_bottom_box.addWidget(self.run_button)
+
+        self.status = QueryStatus()
+        self.status.cancel_button.clicked.connect(self.runner.cancel)
+        self.status.timeout.setValue(self.default_timeout)
+        self.status.memory_limit.setValue(self.default_memory_limit)
+        left_bottom_box.addWidget(self.status)
 
         copy_button = QPushButton('Copy Query')
         copy_button.clicked.connect(self.copy_query)
         left_bottom_box.addWidget(copy_button)
 
+        export_button = QPushButton('Export Results')
+        export_button.clicked.connect(self.export_results)
+        left_bottom_box.addWidget(export_button)
+
         left_frame.addWidget(left_bottom)
         top.addWidget(left_frame)
 
@@ -75,10 +106,7 @@ def user_fun(results, selector):
         self.results = ResultsWidget()
         self.addWidget(self.results)
 
-    def do_query(self):
-        if self.selector is None:
-            return
-        parser = Parser(self.selector)
+    def get_query_details(self):
         query, query_type = self.query_section.get_query()
 
         if self.re_section.use:
@@ -89,35 +117,199 @@ def user_fun(results, selector):
             function = self.function_section.get_query()
         else:
             function = None
+        return query, query_type, regex, function
 
-        try:
-            results = parser.do_query(query, query_type, parser.selector, regex, function)
-        except errors.QueryError as e:
-            errors.show_error_dialog(
-                self,
-                e.title,
-                e.message,
-                e.error_type,
-            )
+    def do_query(self):
+        if self.selector is None:
             return
-
+        query, query_type, regex, function = self.get_query_details()
+
+        self.run_button.setDisabled(True)
+        self.status.start()
+        started = time.perf_counter()
+        self.runner.run(
+            query,
+            query_type,
+            regex,
+            function,
+            self.status.get_timeout(),
+            self.status.get_memory_limit(),
+            dict(self.profile_options),
+        )
+        # set after run, which reports any query it replaces as cancelled
+        self.current_run = {
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'query': query,
+            'type': query_type,
+            'regex': regex,
+            'function': function,
+            'started': started,
+        }
+
+    def query_finished(self, results):
+        self.run_button.setEnabled(True)
+        self.status.finish(f'{len(results)} results')
+        render = Stage('render')
+        start = time.perf_counter()
         self.results.add_results(results)
+        render.time = time.perf_counter() - start
+        render.count = self.results.model.rowCount()
+        self.record_profile('Finished', len(results), render)
+
+    def query_failed(self, title, message, error_type):
+        self.run_button.setEnabled(True)
+        self.status.finish(title)
+        self.record_profile(title, 0)
+        errors.show_error_dialog(
+            self,
+            title,
+            message,
+            error_type,
+        )
+
+    def query_progress(self, elapsed):
+        self.status.update_elapsed(elapsed)
+
+    def query_stopped(self):
+        self.run_button.setEnabled(True)
+        self.status.finish('Cancelled')
+        self.record_profile('Cancelled', 0)
+
+    def record_profile(self, status, count, render=None):
+        if self.current_run is None:
+            return
+        record = self.current_run
+        self.current_run = None
+        profile = self.runner.last_profile or {}
+        stages = list(profile.get('stages', []))
+        if render is not None:
+            stages.append(render.to_dict())
+        record.update(
+            status=status,
+            count=count,
+            total=time.perf_counter() - record.pop('started'),
+            worker_time=profile.get('worker_time'),
+            stages=stages,
+            function_stats=profile.get('function_stats'),
+        )
+        self.profiled.emit(record)
 
     def update_source(self, text):
         self.selector = text
+        self.runner.load(get_text(text))
+        if self.live_runner is not None:
+            self.live_runner.load(get_text(text))
+            self.live_query()
+
+    def set_live(self, enabled):
+        # live previews get their own worker so they never wait behind a full query
+        if enabled and self.live_runner is None:
+            self.live_runner = LiveRunner(self)
+            self.live_runner.preview_ready.connect(self.query_section.show_preview)
+            self.live_runner.preview_failed.connect(self.query_section.show_preview_error)
+            if self.selector is not None:
+                self.live_runner.load(get_text(self.selector))
+        elif not enabled and self.live_runner is not None:
+            self.live_runner.shutdown()
+            self.live_runner.deleteLater()
+            self.live_runner = None
+        self.live_query()
+
+    def live_query(self):
+        if self.live_runner is None or self.selector is None:
+            return
+        query, query_type = self.query_section.get_query()
+        if not query.strip():
+            self.query_section.clear_preview()
+            return
+        self.live_runner.request(query, query_type)
 
     def copy_query(self):
         cb = QApplication.clipboard()
         cb.clear(mode=cb.Clipboard)
-        query, query_type = self.query_section.get_query()
-        text = f"sel.{query_type}('{query}')"
-        if self.re_section.use:
-            text += f'.re({self.re_section.get_query()})'
-        else:
-            text += '.getall()'
+        query, query_type, regex, _ = self.get_query_details()
+        text = query_code(query, query_type, regex)
 
         cb.setText(text, mode=cb.Clipboard)
 
+    def export_results(self):
+        results = self.results.model.results
+        if not results:
+            return
+        path, _ = QFileDialog.getSaveFileName(
+            self,
+            'Export Results',
+            filter='CSV (*.csv);;JSON Lines (*.jsonl)',
+        )
+        if not path:
+            return
+        try:
+            export_results(path, results)
+        except OSError as e:
+            errors.show_error_dialog(self, 'Export Error', f'Could not save results\n\n{e}', 'critical')
+
+
+class QueryStatus(QWidget):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.initUI()
+
+    def initUI(self):
+        grid = QGridLayout()
+        grid.setContentsMargins(0, 0, 0, 0)
+        self.setLayout(grid)
+
+        grid.addWidget(QLabel('Timeout'), 0, 0)
+        self.timeout = QSpinBox()
+        self.timeout.setRange(0, 3600)
+        self.timeout.setSuffix(' s')
+        self.timeout.setSpecialValueText('None')
+        grid.addWidget(self.timeout, 0, 1)
+
+        self.cancel_button = QPushButton('Cancel')
+        self.cancel_button.setDisabled(True)
+        grid.addWidget(self.cancel_button, 0, 2)
+
+        grid.addWidget(QLabel('Memory'), 1, 0)
+        self.memory_limit = QSpinBox()
+        self.memory_limit.setRange(0, 1024 * 1024)
+        self.memory_limit.setSingleStep(256)
+        self.memory_limit.setSuffix(' MB')
+        self.memory_limit.setSpecialValueText('None')
+        grid.addWidget(self.memory_limit, 1, 1)
+
+        self.progress = QProgressBar()
+        self.progress.setTextVisible(False)
+        self.progress.setMaximumHeight(10)
+        grid.addWidget(self.progress, 2, 0, 1, 2)
+
+        self.message = QLabel()
+        grid.addWidget(self.message, 2, 2)
+
+    def get_timeout(self):
+        return self.timeout.value() or None
+
+    def get_memory_limit(self):
+        megabytes = self.memory_limit.value()
+        if not megabytes:
+            return None
+        return megabytes * 1024 * 1024
+
+    def start(self):
+        # busy indicator, the total work for a query can't be known in advance
+        self.progress.setRange(0, 0)
+        self.cancel_button.setEnabled(True)
+        self.message.setText('Running')
+
+    def update_elapsed(self, elapsed):
+        self.message.setText(f'Running {elapsed:.1f}s')
+
+    def finish(self, message):
+        self.progress.setRange(0, 1)
+        self.progress.reset()
+        self.cancel_button.setDisabled(True)
+        self.message.setText(message)
+
 
 class QueryEntry(QWidget):
     def __init__(self, *args, label, **kwargs):
@@ -139,6 +331,8 @@ class QueryEntry(QWidget):
         return self.query.toPlainText()
 
 class QueryChoiceEntry(QueryEntry):
+    type_changed = pyqtSignal()
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.query_type = 'css'
@@ -150,26 +344,70 @@ class QueryChoiceEntry(QueryEntry):
         label = QLabel(self.label)
         grid.addWidget(label, 0, 0)
 
-        css_button = QRadioButton(f'CSS')
-        grid.addWidget(css_button, 1, 0)
-        css_button.toggled.connect(lambda x: self.update_query(x, 'css'))
-        css_button.setChecked(True)
+        self.live_check = QCheckBox('Live')
+        self.live_check.setToolTip('Count matches and show the first results while typing')
+        self.live_check.toggled.connect(self.toggle_preview)
+        grid.addWidget(self.live_check, 0, 1)
+
+        self.css_button = QRadioButton(f'CSS')
+        grid.addWidget(self.css_button, 1, 0)
+        self.css_button.toggled.connect(lambda x: self.update_query(x, 'css'))
+        self.css_button.setChecked(True)
 
-        xpath_button = QRadioButton(f'XPath')
-        xpath_button.toggled.connect(lambda x: self.update_query(x, 'xpath'))
-        grid.addWidget(xpath_button, 2, 0)
+        self.xpath_button = QRadioButton(f'XPath')
+        self.xpath_button.toggled.connect(lambda x: self.update_query(x, 'xpath'))
+        grid.addWidget(self.xpath_button, 2, 0)
 
         self.query = QPlainTextEdit()
         grid.addWidget(self.query, 3, 0, 1, 2)
         self.query.setLineWrapMode(QPlainTextEdit.NoWrap)
 
+        self.preview_label = QLabel()
+        self.preview_label.setWordWrap(True)
+        grid.addWidget(self.preview_label, 4, 0, 1, 2)
+
+        self.preview = QListWidget()
+        self.preview.setMaximumHeight(120)
+        grid.addWidget(self.preview, 5, 0, 1, 2)
+        self.toggle_preview(False)
+
     def update_query(self, selected, query_type):
         if selected:
             self.query_type = query_type
+            self.type_changed.emit()
 
     def get_query(self):
         return self.query.toPlainText(), self.query_type
 
+    def set_query(self, query, query_type):
+        button = self.css_button if query_type == 'css' else self.xpath_button
+        button.setChecked(True)
+        self.query.setPlainText(query)
+
+    def toggle_preview(self, enabled):
+        self.preview_label.setVisible(enabled)
+        self.preview.setVisible(enabled)
+        if not enabled:
+            self.clear_preview()
+
+    def clear_preview(self):
+        self.preview_label.clear()
+        self.preview.clear()
+
+    def show_preview(self, count, results):
+        self.preview_label.setStyleSheet('')
+        self.preview_label.setText(f'{count} matches')
+        self.preview.clear()
+        for result in results:
+            # keep each preview to a single short line
+            line = ' '.join(str(result).split())
+            self.preview.addItem(line[:200])
+
+    def show_preview_error(self, title, message):
+        self.preview_label.setStyleSheet('color: red')
+        self.preview_label.setText(message.splitlines()[-1] if message else title)
+        self.preview.clear()
+
 class OptionalQuery(QueryEntry):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -197,7 +435,69 @@ class OptionalQuery(QueryEntry):
         self.query.setDisabled(not self.use)
 
 
+class ResultsModel(QAbstractTableModel):
+    batch_size = 1000
+    display_length = 500
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.results = []
+        self.loaded = 0
+
+    def set_results(self, results):
+        self.beginResetModel()
+        self.results = [result for result in results if result is not None]
+        self.loaded = 0
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self.loaded
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return 1
+
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return False
+        return self.loaded < len(self.results)
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        count = min(self.batch_size, len(self.results) - self.loaded)
+        self.beginInsertRows(QModelIndex(), self.loaded, self.loaded + count - 1)
+        self.loaded += count
+        self.endInsertRows()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            text = str(self.results[index.row()])
+            if len(text) > self.display_length:
+                text = text[:self.display_length] + '...'
+            return text
+        if role == Qt.ToolTipRole:
+            text = str(self.results[index.row()])
+            if len(text) > self.display_length:
+                return text
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Vertical:
+            return section + 1
+        return 'Result'
+
+
 class ResultsWidget(QWidget):
+    model_class = ResultsModel
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.initUI()
@@ -209,28 +509,33 @@ class ResultsWidget(QWidget):
         label = QLabel("Results:")
         grid.addWidget(label, 0, 0)
 
-        self.table = QTableWidget()
-        self.table.setSizeAdjustPolicy(
-            QAbstractScrollArea.AdjustToContents,
-        )
+        self.model = self.model_class(self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.setWordWrap(True)
 
         self.table.setHorizontalScrollMode(QAbstractItemView.ScrollPerPixel)
         self.table.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.table.verticalScrollBar().valueChanged.connect(self.resize_visible_rows)
+        self.model.rowsInserted.connect(self.resize_visible_rows)
         grid.addWidget(self.table, 1, 0)
 
     def add_results(self, results):
-        self.table.clearContents()
-        self.table.setColumnCount(1)
-        self.table.setRowCount(0)
-
-        for index, result in enumerate(results):
-            if result is not None:
-                self.table.insertRow(index)
-                self.table.setItem(
-                    index,
-                    0,
-                    QTableWidgetItem(str(result)),
-                )
-        self.table.resizeColumnsToContents()
-        self.table.resizeRowsToContents()
+        self.model.set_results(results)
+        if self.model.canFetchMore():
+            self.model.fetchMore()
+        self.resize_visible_rows()
         del results
+
+    def resize_visible_rows(self):
+        # measuring every row is what makes large result sets slow, so only
+        # rows currently on screen are fitted to their contents
+        first = self.table.rowAt(0)
+        if first == -1:
+            return
+        last = self.table.rowAt(self.table.viewport().height())
+        if last == -1:
+            last = self.model.rowCount() - 1
+        for row in range(first, last + 1):
+            self.table.resizeRowToContents(row)
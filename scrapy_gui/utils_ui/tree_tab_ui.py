@@ -0,0 +1,344 @@
+from PyQt5.QtWidgets import *
+from PyQt5.QtCore import *
+from PyQt5.QtGui import *
+
+from lxml import etree
+
+from .locate import local_name, element_children, xpath_for, css_for, elements_at
+from .memory import make_selector
+from .runner import QueryRunner
+from .worker import get_text
+from . import errors
+
+MATCH_COLOUR = QColor(Qt.yellow)
+CONTAINS_MATCH_COLOUR = QColor(255, 255, 200)
+
+
+def describe(element):
+    label = local_name(element)
+    element_id = element.get('id')
+    if element_id:
+        label += f'#{element_id}'
+    classes = element.get('class', '').split()
+    if classes:
+        label += '.' + '.'.join(classes)
+    return label
+
+
+def short_text(element, length=100):
+    text = ' '.join((element.text or '').split())
+    if len(text) > length:
+        text = text[:length] + '...'
+    return text
+
+
+class DomNode:
+    def __init__(self, element, parent=None, row=0):
+        self.element = element
+        self.parent = parent
+        self.row = row
+        self.children = None
+
+    def has_children(self):
+        if self.children is not None:
+            return bool(self.children)
+        return any(isinstance(child.tag, str) for child in self.element)
+
+    def fetch(self):
+        return [
+            DomNode(child, self, row)
+            for row, child in enumerate(element_children(self.element))
+        ]
+
+
+class DomTreeModel(QAbstractItemModel):
+    headers = ['Element', 'Text']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.root = DomNode(None)
+        self.root.children = []
+        self.matches = set()
+        self.contains_matches = set()
+
+    def set_root(self, element):
+        self.beginResetModel()
+        self.root = DomNode(None)
+        # only the top element exists until the tree is expanded
+        self.root.children = [] if element is None else [DomNode(element, self.root, 0)]
+        self.matches = set()
+        self.contains_matches = set()
+        self.endResetModel()
+
+    def node(self, index):
+        if index.isValid():
+            return index.internalPointer()
+        return self.root
+
+    def index(self, row, column, parent=QModelIndex()):
+        node = self.node(parent)
+        if node.children is None or not 0 <= row < len(node.children):
+            return QModelIndex()
+        return self.createIndex(row, column, node.children[row])
+
+    def parent(self, index):
+        if not index.isValid():
+            return QModelIndex()
+        parent = index.internalPointer().parent
+        if parent is None or parent is self.root:
+            return QModelIndex()
+        return self.createIndex(parent.row, 0, parent)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        children = self.node(parent).children
+        return 0 if children is None else len(children)
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(self.headers)
+
+    def hasChildren(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return False
+        return self.node(parent).has_children()
+
+    def canFetchMore(self, parent=QModelIndex()):
+        node = self.node(parent)
+        return node.children is None and node.has_children()
+
+    def fetchMore(self, parent=QModelIndex()):
+        # children are made when a node is first expanded, never before
+        node = self.node(parent)
+        if node.children is not None:
+            return
+        children = node.fetch()
+        if not children:
+            node.children = []
+            return
+        self.beginInsertRows(parent, 0, len(children) - 1)
+        node.children = children
+        self.endInsertRows()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        element = index.internalPointer().element
+        if role == Qt.DisplayRole:
+            if index.column() == 0:
+                return describe(element)
+            return short_text(element)
+        if role == Qt.BackgroundRole:
+            if element in self.matches:
+                return MATCH_COLOUR
+            if element in self.contains_matches:
+                return CONTAINS_MATCH_COLOUR
+        if role == Qt.ToolTipRole and index.column() == 1:
+            return (element.text or '').strip()[:2000] or None
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.headers[section]
+        return None
+
+    def set_matches(self, matches):
+        self.matches = set(matches)
+        # ancestors are marked too so collapsed branches show where matches are
+        self.contains_matches = set()
+        for element in matches:
+            parent = element.getparent()
+            while parent is not None and parent not in self.contains_matches:
+                self.contains_matches.add(parent)
+                parent = parent.getparent()
+
+    def index_for(self, element):
+        path = []
+        while element is not None:
+            path.append(element)
+            element = element.getparent()
+
+        index = QModelIndex()
+        node = self.root
+        for element in reversed(path):
+            if node.children is None:
+                self.fetchMore(index)
+            row = next(
+                (child.row for child in node.children if child.element is element),
+                None,
+            )
+            if row is None:
+                return QModelIndex()
+            index = self.index(row, 0, index)
+            node = node.children[row]
+        return index
+
+
+class DomTree(QWidget):
+    def __init__(self, *args, main, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.main = main
+        self.source = None
+        self.selector = None
+        self.pending_source = None
+        self.matches = []
+        self.current_match = 0
+        # matching runs in a worker so a slow query can't freeze the window
+        self.runner = QueryRunner(self)
+        self.runner.finished.connect(self.highlight_finished)
+        self.runner.failed.connect(self.highlight_failed)
+        self.runner.progress.connect(self.highlight_progress)
+        self.runner.stopped.connect(self.highlight_stopped)
+        self.loaded = None
+        self.initUI()
+
+    def initUI(self):
+        grid = QGridLayout()
+        self.setLayout(grid)
+
+        self.highlight_button = QPushButton('Highlight Query')
+        self.highlight_button.setToolTip('Highlight the elements matched by the query in the Tools tab')
+        self.highlight_button.clicked.connect(self.highlight_query)
+        grid.addWidget(self.highlight_button, 0, 0)
+
+        self.cancel_button = QPushButton('Cancel')
+        self.cancel_button.setDisabled(True)
+        self.cancel_button.clicked.connect(self.runner.cancel)
+        grid.addWidget(self.cancel_button, 0, 1)
+
+        self.match_label = QLabel()
+        grid.addWidget(self.match_label, 0, 2)
+
+        previous_button = QPushButton('Previous')
+        previous_button.clicked.connect(self.previous_match)
+        grid.addWidget(previous_button, 0, 3)
+
+        next_button = QPushButton('Next')
+        next_button.clicked.connect(self.next_match)
+        grid.addWidget(next_button, 0, 4)
+
+        self.model = DomTreeModel(self)
+        self.tree = QTreeView()
+        # every row the same height lets the view skip measuring rows it isn't drawing
+        self.tree.setUniformRowHeights(True)
+        self.tree.setModel(self.model)
+        self.tree.header().setSectionResizeMode(0, QHeaderView.Interactive)
+        self.tree.header().resizeSection(0, 300)
+        self.tree.selectionModel().currentChanged.connect(self.node_selected)
+        grid.addWidget(self.tree, 1, 0, 1, 5)
+
+        grid.addWidget(QLabel('CSS'), 2, 0)
+        self.css_entry = QLineEdit()
+        self.css_entry.setReadOnly(True)
+        grid.addWidget(self.css_entry, 2, 1, 1, 3)
+        css_button = QPushButton('Use CSS')
+        css_button.clicked.connect(lambda: self.use_query(self.css_entry.text(), 'css'))
+        grid.addWidget(css_button, 2, 4)
+
+        grid.addWidget(QLabel('XPath'), 3, 0)
+        self.xpath_entry = QLineEdit()
+        self.xpath_entry.setReadOnly(True)
+        grid.addWidget(self.xpath_entry, 3, 1, 1, 3)
+        xpath_button = QPushButton('Use XPath')
+        xpath_button.clicked.connect(lambda: self.use_query(self.xpath_entry.text(), 'xpath'))
+        grid.addWidget(xpath_button, 3, 4)
+
+    def setSource(self, selector):
+        # the model is only made when the tab is first shown
+        self.pending_source = selector
+        if self.isVisible():
+            self.load_source()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.load_source()
+
+    def load_source(self):
+        if self.pending_source is None:
+            return
+        self.source = self.pending_source
+        # parsed from the text the worker gets, the same way the worker parses it,
+        # so the positions of its matches point at the same elements here
+        self.selector = make_selector(get_text(self.source), lean=True)
+        self.pending_source = None
+        root = getattr(self.selector, 'root', None)
+        self.model.set_root(root if isinstance(root, etree._Element) else None)
+        self.runner.cancel()
+        self.matches = []
+        self.match_label.clear()
+        self.css_entry.clear()
+        self.xpath_entry.clear()
+        self.tree.expandToDepth(0)
+
+    def highlight_query(self):
+        self.load_source()
+        if self.selector is None:
+            return
+        query, query_type = self.main.queries.query_section.get_query()
+        if not query.strip():
+            self.highlight_finished([])
+            return
+        if self.source is not self.loaded:
+            self.runner.load(get_text(self.source))
+            self.loaded = self.source
+        self.highlight_button.setDisabled(True)
+        self.cancel_button.setEnabled(True)
+        self.match_label.setText('Running')
+        self.runner.locate(query, query_type, self.main.queries.status.get_timeout())
+
+    def highlight_progress(self, elapsed):
+        self.match_label.setText(f'Running {elapsed:.1f}s')
+
+    def highlight_finished(self, positions):
+        self.reset_buttons()
+        self.matches = elements_at(self.selector.root, positions) if positions else []
+        self.model.set_matches(self.matches)
+        self.tree.viewport().update()
+        self.current_match = 0
+        self.show_match()
+
+    def highlight_failed(self, title, message, error_type):
+        self.reset_buttons()
+        self.match_label.setText(title)
+        errors.show_error_dialog(self, title, message, error_type)
+
+    def highlight_stopped(self):
+        self.reset_buttons()
+        self.match_label.setText('Cancelled')
+
+    def reset_buttons(self):
+        self.highlight_button.setEnabled(True)
+        self.cancel_button.setDisabled(True)
+
+    def show_match(self):
+        if not self.matches:
+            self.match_label.setText('No matches')
+            return
+        self.match_label.setText(f'{self.current_match + 1} of {len(self.matches)} matches')
+        index = self.model.index_for(self.matches[self.current_match])
+        if index.isValid():
+            self.tree.scrollTo(index)
+            self.tree.setCurrentIndex(index)
+
+    def next_match(self):
+        if self.matches:
+            self.current_match = (self.current_match + 1) % len(self.matches)
+            self.show_match()
+
+    def previous_match(self):
+        if self.matches:
+            self.current_match = (self.current_match - 1) % len(self.matches)
+            self.show_match()
+
+    def node_selected(self, index):
+        if not index.isValid():
+            return
+        element = index.internalPointer().element
+        self.css_entry.setText(css_for(element))
+        self.css_entry.setCursorPosition(0)
+        self.xpath_entry.setText(xpath_for(element))
+        self.xpath_entry.setCursorPosition(0)
+
+    def use_query(self, query, query_type):
+        if query:
+            self.main.queries.query_section.set_query(query, query_type)
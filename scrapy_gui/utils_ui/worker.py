@@ -0,0 +1,335 @@
+from multiprocessing.reduction import ForkingPickler
+import multiprocessing
+import signal
+import time
+import traceback
+import weakref
+
+try:
+    import resource
+except ImportError:
+    # resource limits are only available on unix
+    resource = None
+
+# spawn gives the same behaviour on every platform and avoids forking a running Qt app
+CONTEXT = multiprocessing.get_context('spawn')
+
+
+class ResourceLimitExceeded(BaseException):
+    # not an Exception so user functions can't catch it by accident
+    pass
+
+
+def cpu_limit_exceeded(signum, frame):
+    raise ResourceLimitExceeded('CPU time limit reached')
+
+
+def set_soft_limit(limit, value):
+    _, hard = resource.getrlimit(limit)
+    if value is None or (hard != resource.RLIM_INFINITY and value > hard):
+        value = hard
+    resource.setrlimit(limit, (value, hard))
+
+
+def set_limits(cpu_seconds=None, memory_bytes=None):
+    # soft limits only, so they can be raised again for the next query
+    if resource is None:
+        return
+    if cpu_seconds:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        used = usage.ru_utime + usage.ru_stime
+        cpu_seconds = int(used + cpu_seconds) + 1
+    set_soft_limit(resource.RLIMIT_CPU, cpu_seconds or None)
+    set_soft_limit(resource.RLIMIT_AS, memory_bytes or None)
+
+
+# the last page serialised, so every runner loading it shares one copy of the text
+SERIALISED = {'selector': None, 'text': None}
+
+
+def forget_serialised(reference):
+    # the text goes with the selector, unless a newer page has replaced it already
+    if SERIALISED['selector'] is reference:
+        SERIALISED.update(selector=None, text=None)
+
+
+def get_text(selector):
+    # scrapy responses carry their text, plain parsel selectors need serialising
+    text = getattr(selector, 'text', None)
+    if text is None:
+        last = SERIALISED['selector']
+        if last is not None and last() is selector:
+            return SERIALISED['text']
+        text = selector.get()
+        SERIALISED.update(selector=weakref.ref(selector, forget_serialised), text=text)
+    return text
+
+
+def serve(connection):
+    from cssselect.xpath import ExpressionError
+    from cssselect.parser import SelectorSyntaxError
+    from lxml import etree
+    from .parser import Parser, fingerprint, clear_document_caches
+    from .profiler import QueryProfile, NULL_PROFILE
+    from .advisor import get_candidates, compare_queries
+    from .locate import locate_query, evaluate_candidates
+    from .dom_diff import diff_trees, diff_results
+    from .pipeline import run_pipeline
+    from .regex_engine import get_timeout
+    from .memory import make_selector
+    from . import errors
+
+    if hasattr(signal, 'SIGXCPU'):
+        signal.signal(signal.SIGXCPU, cpu_limit_exceeded)
+
+    parser = None
+    rendered = None
+    tree_diff = None
+    while True:
+        try:
+            command, payload = connection.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+
+        if command == 'load':
+            document_id = fingerprint(payload)
+            # the same page sent again keeps its tree and cached results
+            if parser is None or parser.get_document_id() != document_id:
+                # results from the last page keep its whole tree alive, so they go
+                # with it before the new page is parsed
+                parser = None
+                clear_document_caches()
+                # the worker only queries the tree, so the text isn't kept beside it
+                parser = Parser(make_selector(payload, lean=True), document_id)
+            payload = None
+        elif command == 'query':
+            query, query_type, regex, function, cpu_limit, memory_limit, profile_options = payload
+            profile = QueryProfile(**profile_options) if profile_options else NULL_PROFILE
+            parser.profile = profile
+            with profile.tracing():
+                start = time.perf_counter()
+                kind, result = run_query(parser, query, query_type, regex, function, cpu_limit, memory_limit)
+                if kind == 'results':
+                    with profile.stage('serialise') as stage:
+                        data = dump_results(result)
+                        stage.count = len(result)
+                elapsed = time.perf_counter() - start
+            parser.profile = NULL_PROFILE
+            if profile_options:
+                # sent ahead of the results so the runner has it when they arrive
+                connection.send(('profile', dict(profile.to_dict(), worker_time=elapsed)))
+            if kind == 'results':
+                connection.send_bytes(data)
+            else:
+                connection.send((kind, result))
+        elif command == 'preview':
+            query, query_type, limit = payload
+            try:
+                preview = parser.preview(query, query_type, limit)
+            except errors.QueryError as e:
+                connection.send(('error', (e.title, e.message, e.error_type)))
+                continue
+            except Exception:
+                # reported like any other error so the worker keeps its document and caches
+                connection.send(('error', ('Query Error', f'{query}\n\n{traceback.format_exc()}', 'critical')))
+                continue
+            connection.send(('results', preview))
+        elif command == 'benchmark':
+            query, query_type, alternatives, suggest, repeat = payload
+            document_type = getattr(parser.selector, 'type', 'html')
+            try:
+                candidates = get_candidates(query, query_type, alternatives, suggest, document_type)
+            except (ExpressionError, SelectorSyntaxError, ValueError) as e:
+                connection.send(('error', (
+                    f'{query_type.title()} Error',
+                    f'Error parsing {query_type} query\n\n{e}',
+                    'critical',
+                )))
+                continue
+            # candidates that fail, like invalid alternatives, are reported in their own row
+            connection.send(('results', compare_queries(parser.selector, candidates, repeat)))
+        elif command == 'locate':
+            query, query_type = payload
+            try:
+                positions = locate_query(parser.selector, query, query_type)
+            except errors.QueryError as e:
+                connection.send(('error', (e.title, e.message, e.error_type)))
+                continue
+            connection.send(('results', positions))
+        elif command == 'pick':
+            try:
+                report = evaluate_candidates(parser.selector, payload)
+            except errors.QueryError as e:
+                connection.send(('error', (e.title, e.message, e.error_type)))
+                continue
+            except (ExpressionError, SelectorSyntaxError, ValueError, KeyError, TypeError, etree.LxmlError) as e:
+                # the steps come from a script in the page, so they may not be well formed
+                connection.send(('error', ('Picker Error', f'Error checking the picked element\n\n{e}', 'critical')))
+                continue
+            connection.send(('results', report))
+        elif command == 'compare':
+            text, query, query_type, regex, function, cpu_limit, memory_limit = payload
+            try:
+                document_id = fingerprint(text)
+                if rendered is None or rendered.document_id != document_id:
+                    rendered = Parser(make_selector(text, lean=True), document_id)
+                if not all(isinstance(document.selector.root, etree._Element) for document in (parser, rendered)):
+                    raise errors.QueryError(
+                        title='Compare Error',
+                        message='Only html and xml pages can be compared',
+                        error_type='critical',
+                    )
+                # the tree diff doesn't depend on the query, so it's kept for the next one
+                key = (parser.get_document_id(), document_id)
+                if tree_diff is None or tree_diff[0] != key:
+                    tree_diff = (key, diff_trees(parser.selector.root, rendered.selector.root))
+                report = {'tree': tree_diff[1], 'results': None}
+                if query.strip():
+                    raw_kind, raw_results = run_query(parser, query, query_type, regex, function, cpu_limit, memory_limit)
+                    if raw_kind == 'error':
+                        connection.send((raw_kind, raw_results))
+                        continue
+                    kind, results = run_query(rendered, query, query_type, regex, function, cpu_limit, memory_limit)
+                    if kind == 'error':
+                        connection.send((kind, results))
+                        continue
+                    report['results'] = diff_results(
+                        [str(result) for result in raw_results],
+                        [str(result) for result in results],
+                    )
+            except errors.QueryError as e:
+                connection.send(('error', (e.title, e.message, e.error_type)))
+                continue
+            except (ExpressionError, SelectorSyntaxError, ValueError, etree.LxmlError) as e:
+                connection.send(('error', ('Compare Error', f'Error comparing the pages\n\n{e}', 'critical')))
+                continue
+            connection.send(('results', report))
+        elif command == 'pipeline':
+            rows, fields, cpu_limit, memory_limit = payload
+            # stage timings always come back so the tab can show what was cached
+            parser.profile = QueryProfile()
+            parser.regex_timeout = get_timeout(cpu_limit)
+            kind, result = run_limited(
+                lambda: run_pipeline(parser, rows, fields), cpu_limit, memory_limit, 'Pipeline'
+            )
+            if kind == 'results':
+                result['stages'] = parser.profile.to_dict()['stages']
+            parser.profile = NULL_PROFILE
+            connection.send((kind, result))
+
+
+def run_query(parser, query, query_type, regex, function, cpu_limit, memory_limit):
+    from .regex_engine import get_timeout
+
+    parser.regex_timeout = get_timeout(cpu_limit)
+    return run_limited(
+        lambda: parser.do_query(query, query_type, parser.selector, regex, function),
+        cpu_limit,
+        memory_limit,
+        query,
+    )
+
+
+def run_limited(run, cpu_limit, memory_limit, description):
+    from . import errors
+
+    try:
+        set_limits(cpu_limit, memory_limit)
+        return 'results', run()
+    except errors.QueryError as e:
+        return 'error', (e.title, e.message, e.error_type)
+    except ResourceLimitExceeded as e:
+        return 'error', ('Query Stopped', f'{e}\n\n{description}', 'critical')
+    except MemoryError:
+        return 'error', ('Query Stopped', f'Memory limit reached\n\n{description}', 'critical')
+    except Exception:
+        # anything unexpected is reported too, rather than ending the worker and its caches
+        return 'error', ('Query Error', f'{description}\n\n{traceback.format_exc()}', 'critical')
+    finally:
+        set_limits()
+
+
+def dump_results(results):
+    # pickled here rather than in send so the cost shows up in the profile
+    try:
+        return ForkingPickler.dumps(('results', results))
+    except Exception:
+        # user functions may return objects that can't cross the process boundary
+        return ForkingPickler.dumps(('results', [str(result) for result in results]))
+
+
+class QueryWorker:
+    def __init__(self):
+        self.process = None
+        self.connection = None
+        self.text = None
+
+    def start(self):
+        self.connection, child_connection = CONTEXT.Pipe()
+        self.process = CONTEXT.Process(target=serve, args=(child_connection,), daemon=True)
+        self.process.start()
+        child_connection.close()
+        if self.text is not None:
+            self.connection.send(('load', self.text))
+
+    def is_alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    def load(self, text):
+        self.text = text
+        if self.is_alive():
+            self.connection.send(('load', text))
+        else:
+            self.start()
+
+    def query(self, query, query_type, regex=None, function=None, cpu_limit=None, memory_limit=None,
+              profile_options=None):
+        if not self.is_alive():
+            self.start()
+        payload = (query, query_type, regex, function, cpu_limit, memory_limit, profile_options)
+        self.connection.send(('query', payload))
+
+    def preview(self, query, query_type, limit):
+        if not self.is_alive():
+            self.start()
+        self.connection.send(('preview', (query, query_type, limit)))
+
+    def benchmark(self, query, query_type, alternatives=(), suggest=True, repeat=5):
+        if not self.is_alive():
+            self.start()
+        self.connection.send(('benchmark', (query, query_type, list(alternatives), suggest, repeat)))
+
+    def locate(self, query, query_type):
+        if not self.is_alive():
+            self.start()
+        self.connection.send(('locate', (query, query_type)))
+
+    def pick(self, steps):
+        if not self.is_alive():
+            self.start()
+        self.connection.send(('pick', steps))
+
+    def compare(self, text, query, query_type, regex=None, function=None, cpu_limit=None, memory_limit=None):
+        if not self.is_alive():
+            self.start()
+        payload = (text, query, query_type, regex, function, cpu_limit, memory_limit)
+        self.connection.send(('compare', payload))
+
+    def pipeline(self, rows, fields, cpu_limit=None, memory_limit=None):
+        if not self.is_alive():
+            self.start()
+        self.connection.send(('pipeline', (rows, fields, cpu_limit, memory_limit)))
+
+    def poll(self):
+        return self.connection is not None and self.connection.poll()
+
+    def receive(self):
+        return self.connection.recv()
+
+    def terminate(self):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.join()
+            self.connection.close()
+        self.process = None
+        self.connection = None
@@ -19,13 +19,22 @@ setuptools.setup(
         "Operating System :: OS Independent",
     ],
     install_requires=[
-        'requests>=2.22.0',
         'PyQtWebEngine>=5.14.0',
         'parsel>=1.5.2',
+        'w3lib>=1.21.0',
         'cssselect>=1.1.0',
-        'beautifulsoup4>=4.8.2',
+        'lxml>=4.5.0',
         'PyQt5>=5.14.0',
       ],
-    python_requires='>=3.6',
+    extras_require={
+        'benchmarks': ['beautifulsoup4>=4.8.2'],
+    },
+    python_requires='>=3.7',
     include_package_data=True,
+    entry_points={
+        'console_scripts': [
+            'scrapy-gui-batch=scrapy_gui.batch:main',
+            'scrapy-gui-query=scrapy_gui.engine:main',
+        ],
+    },
 )